@@ -0,0 +1,184 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import get_database
+
+# Archival settings
+ARCHIVE_COLLECTION = "reviews_archive"
+ARCHIVE_MAX_AGE_DAYS = int(os.getenv("ARCHIVE_MAX_AGE_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Seconds between background archival runs, 0 disables the background task
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+DUPLICATE_KEY_ERROR = 11000
+
+archive_task = None
+
+def archive_filter(max_age_days: int) -> dict:
+    """Reviews that belong in the archive: rejected ones and anything too old
+
+    Old pending reviews are archived too; moderate_review restores them from
+    the archive when an admin approves or rejects one.
+    """
+    # Review dates are "%Y-%m-%d" strings, so they compare lexicographically
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d")
+    return {"$or": [
+        {"status": "rejected"},
+        {"date": {"$lt": cutoff}}
+    ]}
+
+async def refresh_archived_totals(tool_ids: set):
+    """Store archived approved rating totals on each tool document"""
+    db = get_database()
+    totals = {tool_id: (0, 0) for tool_id in tool_ids}
+    pipeline = [
+        {"$match": {"tool_id": {"$in": list(tool_ids)}, "status": "approved"}},
+        {"$group": {"_id": "$tool_id", "sum": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+    ]
+    async for row in db[ARCHIVE_COLLECTION].aggregate(pipeline):
+        totals[row["_id"]] = (row["sum"], row["count"])
+
+    for tool_id, (rating_sum, count) in totals.items():
+        if not ObjectId.is_valid(tool_id):
+            continue
+        await db.tools.update_one(
+            {"_id": ObjectId(tool_id)},
+            {"$set": {
+                "archived_rating_sum": rating_sum,
+                "archived_review_count": count
+            }}
+        )
+
+async def settle_pending_totals(recalculate):
+    """Refresh tool totals for archived copies whose totals were never refreshed
+
+    Copies are written with `totals_pending` and only lose it once their tool's
+    archived totals have been refreshed, so a crash part way through a batch is
+    repaired by the next run.
+    """
+    db = get_database()
+    pending = await db[ARCHIVE_COLLECTION].find(
+        {"totals_pending": True}, {"tool_id": 1}
+    ).to_list(length=None)
+    if not pending:
+        return
+
+    tool_ids = {r["tool_id"] for r in pending}
+    await refresh_archived_totals(tool_ids)
+    for tool_id in tool_ids:
+        await recalculate(tool_id)
+    await db[ARCHIVE_COLLECTION].update_many(
+        {"_id": {"$in": [r["_id"] for r in pending]}},
+        {"$unset": {"totals_pending": ""}}
+    )
+
+async def archive_batch(recalculate, max_age_days: int, batch_size: int) -> int:
+    """Move one batch of reviews to the archive, returning how many were read"""
+    db = get_database()
+    reviews = await db.reviews.find(archive_filter(max_age_days)).limit(batch_size).to_list(length=None)
+    if not reviews:
+        return 0
+
+    # Copy first so a crash never loses reviews; a rerun skips the copies
+    # that already made it into the archive
+    try:
+        await db[ARCHIVE_COLLECTION].insert_many(
+            [{**r, "totals_pending": True} for r in reviews], ordered=False
+        )
+    except BulkWriteError as e:
+        if any(err["code"] != DUPLICATE_KEY_ERROR for err in e.details["writeErrors"]):
+            raise
+
+    # Only delete hot reviews still in the state that was copied; one moderated
+    # in the meantime stays hot and its stale copy is dropped
+    by_status = {}
+    for review in reviews:
+        by_status.setdefault(review["status"], []).append(review["_id"])
+    for status, ids in by_status.items():
+        result = await db.reviews.delete_many({"_id": {"$in": ids}, "status": status})
+        if result.deleted_count < len(ids):
+            changed = await db.reviews.find(
+                {"_id": {"$in": ids}, "status": {"$ne": status}}, {"_id": 1}
+            ).to_list(length=None)
+            if changed:
+                await db[ARCHIVE_COLLECTION].delete_many(
+                    {"_id": {"$in": [r["_id"] for r in changed]}}
+                )
+
+    # Approved ratings still count towards the tool's average once archived
+    await settle_pending_totals(recalculate)
+    return len(reviews)
+
+async def archive_reviews(
+    recalculate,
+    max_age_days: int = ARCHIVE_MAX_AGE_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE
+) -> int:
+    """Archive all eligible reviews in batches
+
+    `recalculate` is called with each tool id whose rating aggregates changed.
+    """
+    await settle_pending_totals(recalculate)
+    total = 0
+    while True:
+        moved = await archive_batch(recalculate, max_age_days, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+async def create_archive_indexes():
+    db = get_database()
+    # get_archived_reviews sorts newest first under each filter combination;
+    # the prefixes serve the totals refresh, the delete cascade and the stats
+    await db[ARCHIVE_COLLECTION].create_index([("tool_id", 1), ("status", 1), ("date", -1)])
+    await db[ARCHIVE_COLLECTION].create_index([("tool_id", 1), ("date", -1)])
+    await db[ARCHIVE_COLLECTION].create_index([("status", 1), ("date", -1)])
+    await db[ARCHIVE_COLLECTION].create_index([("date", -1)])
+    await db[ARCHIVE_COLLECTION].create_index([("totals_pending", 1)], sparse=True)
+
+async def restore_review(review_id: ObjectId):
+    """Move an archived review back to the hot collection so it can be moderated
+
+    The caller recalculates the tool's rating afterwards.
+    """
+    db = get_database()
+    review = await db[ARCHIVE_COLLECTION].find_one({"_id": review_id})
+    if not review:
+        return None
+
+    review.pop("totals_pending", None)
+    try:
+        await db.reviews.insert_one(review)
+    except DuplicateKeyError:
+        pass
+    await db[ARCHIVE_COLLECTION].delete_one({"_id": review_id})
+    if review["status"] == "approved":
+        await refresh_archived_totals({review["tool_id"]})
+    return review
+
+async def run_archiver(recalculate):
+    """Periodically archive reviews in the background"""
+    while True:
+        try:
+            moved = await archive_reviews(recalculate)
+            if moved:
+                print(f"Archived {moved} reviews")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Review archival failed: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+async def start_archiver(recalculate):
+    global archive_task
+    await create_archive_indexes()
+    if ARCHIVE_INTERVAL_SECONDS > 0 and archive_task is None:
+        archive_task = asyncio.create_task(run_archiver(recalculate))
+
+async def stop_archiver():
+    global archive_task
+    if archive_task:
+        archive_task.cancel()
+        archive_task = None
@@ -2,7 +2,7 @@ import bcrypt
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import HTTPException, Security, Depends
+from fastapi import HTTPException, Security, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 
@@ -12,6 +12,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
@@ -48,14 +49,21 @@ def decode_token(token: str) -> dict:
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Security(security)
-):
-    """Get current authenticated user"""
+def token_subject(authorization: Optional[str]) -> Optional[str]:
+    """Read the user id from an Authorization header without touching the database"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+async def user_from_token(token: str) -> dict:
+    """Load the user a JWT belongs to"""
     from database import get_database
     from bson import ObjectId
     
-    token = credentials.credentials
     payload = decode_token(token)
     user_id = payload.get("sub")
     
@@ -70,6 +78,27 @@ async def get_current_user(
     
     return user
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Security(security)
+):
+    """Get current authenticated user"""
+    return await user_from_token(credentials.credentials)
+
+async def get_current_stream_user(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(optional_security)
+):
+    """Get current user from the Authorization header or a ?token= parameter
+
+    Browser EventSource connections can't set headers, so streaming endpoints
+    also accept the token in the query string.
+    """
+    if credentials:
+        return await user_from_token(credentials.credentials)
+    if token:
+        return await user_from_token(token)
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
     """Get current authenticated admin user"""
     if current_user.get("role") != "admin":
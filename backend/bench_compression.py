@@ -0,0 +1,135 @@
+"""Benchmark response compression for the full-catalog and review list endpoints.
+
+Runs the app against the in-memory backend and reports bytes on the wire and
+CPU time per request for each encoding, with and without the compressed cache.
+
+    python bench_compression.py --tools 500 --reviews 2000 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("ARCHIVE_INTERVAL_SECONDS", "0")
+
+import compression
+import main
+from auth import create_access_token
+from database import get_database
+
+CATEGORIES = ["NLP", "Computer Vision", "Dev Tools", "Audio", "Video", "Data Analytics"]
+PRICING_MODELS = ["Free", "Paid", "Subscription"]
+
+async def seed(tool_count: int, review_count: int) -> str:
+    """Fill the in-memory database and return an admin token"""
+    db = get_database()
+    tools = [
+        {
+            "name": f"Tool {i}",
+            "use_case": f"Use case description for tool number {i}, " * 3,
+            "category": random.choice(CATEGORIES),
+            "pricing_model": random.choice(PRICING_MODELS),
+            "average_rating": round(random.uniform(1, 5), 1),
+            "review_count": random.randint(0, 50)
+        }
+        for i in range(tool_count)
+    ]
+    result = await db.tools.insert_many(tools)
+    tool_ids = [str(tool_id) for tool_id in result.inserted_ids]
+    await db.reviews.insert_many([
+        {
+            "tool_id": random.choice(tool_ids),
+            "tool_name": "Tool",
+            "user_id": "bench",
+            "rating": random.randint(1, 5),
+            "comment": "A fairly typical review comment about the tool.",
+            "status": "approved",
+            "date": "2026-01-01"
+        }
+        for _ in range(review_count)
+    ])
+    admin = await db.users.insert_one({
+        "email": "bench@example.com",
+        "name": "Bench",
+        "hashed_password": "",
+        "role": "admin"
+    })
+    return create_access_token(data={"sub": str(admin.inserted_id)})
+
+async def request(path: str, token: str, accept_encoding: str) -> int:
+    """Send one GET through the ASGI app and return the body bytes sent"""
+    path, _, query = path.partition("?")
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    if accept_encoding:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80)
+    }
+    sent = 0
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    done = asyncio.Event()
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    await main.app(scope, receive, send)
+    done.set()
+    return sent
+
+async def measure(path: str, token: str, accept_encoding: str, count: int) -> tuple:
+    sizes = []
+    start = time.process_time()
+    for _ in range(count):
+        sizes.append(await request(path, token, accept_encoding))
+    cpu_ms = (time.process_time() - start) * 1000 / count
+    return sum(sizes) / len(sizes), cpu_ms
+
+async def run(args):
+    await main.startup_db_client()
+    token = await seed(args.tools, args.reviews)
+    encodings = ["identity"] + compression.supported_encodings()
+
+    print(f"{'endpoint':<28} {'encoding':<10} {'cache':<6} {'bytes/req':>10} {'cpu ms/req':>11}")
+    for path in ["/api/tools", "/api/tools?category=NLP", "/api/reviews"]:
+        for encoding in encodings:
+            accept_encoding = "" if encoding == "identity" else encoding
+            for cached in ([False] if encoding == "identity" else [False, True]):
+                if not cached:
+                    compression.cache.max_bytes = 0
+                else:
+                    compression.cache.max_bytes = compression.COMPRESSION_CACHE_BYTES
+                    await request(path, token, accept_encoding)
+                size, cpu_ms = await measure(path, token, accept_encoding, args.requests)
+                print(f"{path:<28} {encoding:<10} {'yes' if cached else 'no':<6} {size:>10.0f} {cpu_ms:>11.3f}")
+
+    await main.shutdown_db_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tools", type=int, default=500)
+    parser.add_argument("--reviews", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=100)
+    random.seed(0)
+    asyncio.run(run(parser.parse_args()))
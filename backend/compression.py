@@ -0,0 +1,192 @@
+import gzip
+import hashlib
+import os
+import time
+from collections import Counter, OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression settings
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+# Upper bound on compressed bytes kept for repeated identical responses
+COMPRESSION_CACHE_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+# Compression counters (bytes before/after, cache hits, CPU seconds)
+metrics: Counter = Counter()
+
+def supported_encodings() -> list:
+    """Encodings in order of preference"""
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+def choose_encoding(accept_encoding: str):
+    """Pick the best encoding the client accepts, or None"""
+    accepted, refused = set(), set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    refused.add(token)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token)
+    # An explicit q=0 wins over the wildcard
+    for encoding in supported_encodings():
+        if encoding in refused:
+            continue
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+def header_value(headers: list, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+class CompressedCache:
+    """LRU cache of compressed bodies bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+cache = CompressedCache(COMPRESSION_CACHE_BYTES)
+
+def compressed_body(scope, body: bytes, encoding: str) -> bytes:
+    """Compress a body, reusing earlier output for the same endpoint, filter and content"""
+    key = (
+        scope["path"],
+        scope.get("query_string", b""),
+        encoding,
+        hashlib.sha1(body).digest()
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        metrics["cache_hits"] += 1
+        return cached
+
+    start = time.process_time()
+    compressed = compress(body, encoding)
+    metrics["cpu_seconds"] += time.process_time() - start
+    metrics["cache_misses"] += 1
+    cache.put(key, compressed)
+    return compressed
+
+class CompressionMiddleware:
+    """Negotiates gzip/brotli for responses above COMPRESSION_MIN_SIZE
+
+    Only responses that declare a Content-Length are buffered and compressed;
+    streaming responses (such as /api/events) pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        passthrough = False
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_length = header_value(headers, b"content-length")
+                content_type = header_value(headers, b"content-type") or b""
+                if (
+                    content_length is None
+                    or int(content_length) < COMPRESSION_MIN_SIZE
+                    or header_value(headers, b"content-encoding") is not None
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            # Inner middleware may deliver the body in several chunks
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = list(start_message.get("headers", []))
+
+            compressed = compressed_body(scope, body, encoding)
+            metrics["responses"] += 1
+            metrics["bytes_in"] += len(body)
+            metrics["bytes_out"] += len(compressed)
+
+            vary = header_value(headers, b"vary")
+            headers = [
+                (key, value) for key, value in headers
+                if key.lower() not in (b"content-length", b"vary")
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+def compression_stats() -> dict:
+    return {
+        "encodings": supported_encodings(),
+        "min_size": COMPRESSION_MIN_SIZE,
+        "cache_entries": len(cache.entries),
+        "cache_bytes": cache.size,
+        **metrics
+    }
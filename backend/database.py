@@ -5,6 +5,8 @@ import os
 # MongoDB connection settings
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
 DATABASE_NAME = "ai_tools_db"
+# "mongo" for a live server, "memory" for the in-process stand-in
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "mongo")
 
 # MongoDB client
 client = None
@@ -13,25 +15,41 @@ database = None
 async def connect_to_mongo():
     """Connect to MongoDB"""
     global client, database
-    client = AsyncIOMotorClient(MONGODB_URL)
+    if DATABASE_BACKEND == "memory":
+        from memory_db import MemoryClient
+        client = MemoryClient()
+    else:
+        client = AsyncIOMotorClient(MONGODB_URL)
     database = client[DATABASE_NAME]
     
     # Create indexes for tools
     await database.tools.create_index([("name", ASCENDING)])
-    await database.tools.create_index([("category", ASCENDING)])
-    await database.tools.create_index([("pricing_model", ASCENDING)])
+    # get_tools filters: equality fields first, the min_rating range last. The
+    # prefixes serve category-only and pricing-only filters
+    await database.tools.create_index(
+        [("category", ASCENDING), ("pricing_model", ASCENDING), ("average_rating", ASCENDING)]
+    )
+    await database.tools.create_index(
+        [("pricing_model", ASCENDING), ("average_rating", ASCENDING)]
+    )
     await database.tools.create_index([("average_rating", DESCENDING)])
     
     # Create indexes for reviews
     await database.reviews.create_index([("tool_id", ASCENDING)])
     await database.reviews.create_index([("status", ASCENDING)])
     await database.reviews.create_index([("user_id", ASCENDING)])
+    await database.reviews.create_index([("date", ASCENDING)])
+    
+    # Create indexes for daily rating history buckets
+    await database.rating_history.create_index(
+        [("tool_id", ASCENDING), ("day", ASCENDING)], unique=True
+    )
     
     # Create indexes for users
     await database.users.create_index([("email", ASCENDING)], unique=True)
     await database.users.create_index([("created_at", DESCENDING)])
     
-    print("Connected to MongoDB!")
+    print(f"Connected to MongoDB! ({DATABASE_BACKEND} backend)")
 
 async def close_mongo_connection():
     """Close MongoDB connection"""
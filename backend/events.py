@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+# Event hub settings
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Set to "1" to fan events out across workers through a MongoDB change
+# stream (requires a replica set)
+EVENTS_CHANGE_STREAM = os.getenv("EVENTS_CHANGE_STREAM", "0") == "1"
+EVENTS_COLLECTION = "events"
+# Longest wait between attempts to reopen a failed change stream
+EVENTS_RETRY_MAX_SECONDS = float(os.getenv("EVENTS_RETRY_MAX_SECONDS", "60"))
+
+# Audiences an event can be sent to
+AUDIENCE_ALL = "all"
+AUDIENCE_ADMIN = "admin"
+
+class Subscription:
+    """A single connected client with its own bounded queue"""
+
+    def __init__(self, is_admin: bool, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.is_admin = is_admin
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, event: dict) -> bool:
+        """Check whether this subscriber may see the event"""
+        return event["audience"] == AUDIENCE_ALL or self.is_admin
+
+    def offer(self, event: dict):
+        """Queue an event, dropping the oldest one if the client is behind"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+class EventHub:
+    """In-process pub/sub hub feeding the SSE endpoint"""
+
+    def __init__(self):
+        self.subscribers: set = set()
+        self.watch_task: Optional[asyncio.Task] = None
+        # True only while this worker's change stream cursor is open
+        self.stream_open = False
+
+    def subscribe(self, is_admin: bool) -> Subscription:
+        subscription = Subscription(is_admin)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def dispatch(self, event: dict):
+        """Deliver an event to every local subscriber allowed to see it"""
+        for subscription in list(self.subscribers):
+            if subscription.wants(event):
+                subscription.offer(event)
+
+    async def publish(self, event_type: str, data: dict, audience: str = AUDIENCE_ALL):
+        """Publish an event after a write has been committed"""
+        event = {
+            "type": event_type,
+            "data": data,
+            "audience": audience,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if self.stream_open:
+            # The change stream watcher dispatches it to every worker,
+            # including this one
+            from database import get_database
+            try:
+                await get_database()[EVENTS_COLLECTION].insert_one(
+                    {**event, "created_at": datetime.utcnow()}
+                )
+                return
+            except Exception as e:
+                # The write itself has committed, so never fail the request;
+                # at least this worker's subscribers still hear about it
+                print(f"Event publish failed, dispatching locally: {e}")
+        self.dispatch(event)
+
+    async def start(self):
+        """Start the change stream watcher when cross-worker events are enabled
+
+        Until the stream is open, events are dispatched to local subscribers.
+        """
+        if EVENTS_CHANGE_STREAM and self.watch_task is None:
+            from database import DATABASE_BACKEND, get_database
+            if DATABASE_BACKEND == "memory":
+                print("Change stream events need MongoDB; dispatching events locally")
+                return
+            # Events are only needed long enough to reach every worker
+            await get_database()[EVENTS_COLLECTION].create_index(
+                [("created_at", 1)], expireAfterSeconds=3600
+            )
+            self.watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        self.stream_open = False
+        if self.watch_task:
+            self.watch_task.cancel()
+            self.watch_task = None
+
+    async def _watch(self):
+        """Fan out events inserted by any worker"""
+        from database import get_database
+        collection = get_database()[EVENTS_COLLECTION]
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        delay = 1
+        while True:
+            try:
+                # Entering the context opens the cursor, so the stream is
+                # live before publish starts routing events through it
+                async with collection.watch(pipeline) as stream:
+                    self.stream_open = True
+                    delay = 1
+                    async for change in stream:
+                        event = change["fullDocument"]
+                        event.pop("_id", None)
+                        event.pop("created_at", None)
+                        self.dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event change stream error, dispatching locally: {e}")
+            finally:
+                self.stream_open = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENTS_RETRY_MAX_SECONDS)
+
+def format_sse(event: dict) -> str:
+    """Format an event as a server-sent events message"""
+    payload = {"data": event["data"], "timestamp": event["timestamp"]}
+    return f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+
+async def event_stream(subscription: Subscription, is_disconnected):
+    """Yield SSE messages for a subscription until the client goes away"""
+    try:
+        yield "retry: 3000\n\n"
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(),
+                    timeout=EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing idle connections
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        hub.unsubscribe(subscription)
+
+hub = EventHub()
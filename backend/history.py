@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from database import get_database, connect_to_mongo, close_mongo_connection
+
+# Daily rating buckets per tool
+HISTORY_COLLECTION = "rating_history"
+DATE_FORMAT = "%Y-%m-%d"
+
+def normalize_day(value: str) -> str:
+    """Parse a date and return it zero-padded, matching the stored `day` strings"""
+    return datetime.strptime(value, DATE_FORMAT).strftime(DATE_FORMAT)
+
+async def record_moderation(review: dict, new_status: str):
+    """Apply a moderation decision to today's bucket for the review's tool"""
+    was_approved = review["status"] == "approved"
+    is_approved = new_status == "approved"
+    if was_approved == is_approved:
+        return
+
+    # Un-approving a review takes its rating back out of the running totals
+    delta = 1 if is_approved else -1
+    db = get_database()
+    await db[HISTORY_COLLECTION].update_one(
+        {"tool_id": review["tool_id"], "day": datetime.now().strftime(DATE_FORMAT)},
+        {"$inc": {
+            "count": delta,
+            "sum": delta * review["rating"],
+            f"stars.{review['rating']}": delta
+        }},
+        upsert=True
+    )
+
+async def get_rating_history(
+    tool_id: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> list:
+    """Daily buckets with the tool's running average at the end of each day"""
+    db = get_database()
+
+    # Totals from before the range seed the running average
+    count, rating_sum = 0, 0
+    if date_from:
+        pipeline = [
+            {"$match": {"tool_id": tool_id, "day": {"$lt": date_from}}},
+            {"$group": {"_id": None, "count": {"$sum": "$count"}, "sum": {"$sum": "$sum"}}}
+        ]
+        async for row in db[HISTORY_COLLECTION].aggregate(pipeline):
+            count, rating_sum = row["count"], row["sum"]
+
+    day_filter = {}
+    if date_from:
+        day_filter["$gte"] = date_from
+    if date_to:
+        day_filter["$lte"] = date_to
+    query_filter = {"tool_id": tool_id}
+    if day_filter:
+        query_filter["day"] = day_filter
+
+    history = []
+    async for bucket in db[HISTORY_COLLECTION].find(query_filter).sort("day", 1):
+        count += bucket["count"]
+        rating_sum += bucket["sum"]
+        history.append({
+            "day": bucket["day"],
+            "count": bucket["count"],
+            "sum": bucket["sum"],
+            "stars": {star: bucket.get("stars", {}).get(star, 0) for star in "12345"},
+            "total_count": count,
+            "average_rating": round(rating_sum / count, 1) if count else 0.0
+        })
+    return history
+
+async def backfill_rating_history():
+    """Rebuild every bucket from the approved reviews, hot and archived
+
+    One-off for reviews approved before buckets were recorded. Their moderation
+    day is unknown, so each one is bucketed under its review date. Run it while
+    no moderation is happening, since it replaces the whole collection.
+    """
+    from archive import ARCHIVE_COLLECTION
+
+    db = get_database()
+    pipeline = [
+        {"$match": {"status": "approved"}},
+        {"$group": {
+            "_id": {"tool_id": "$tool_id", "day": "$date", "rating": "$rating"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    buckets = {}
+    for collection in ("reviews", ARCHIVE_COLLECTION):
+        async for row in db[collection].aggregate(pipeline):
+            key = (row["_id"]["tool_id"], row["_id"]["day"])
+            bucket = buckets.setdefault(key, {
+                "tool_id": key[0], "day": key[1], "count": 0, "sum": 0, "stars": {}
+            })
+            rating = row["_id"]["rating"]
+            bucket["count"] += row["count"]
+            bucket["sum"] += row["count"] * rating
+            bucket["stars"][str(rating)] = bucket["stars"].get(str(rating), 0) + row["count"]
+
+    await db[HISTORY_COLLECTION].delete_many({})
+    if buckets:
+        await db[HISTORY_COLLECTION].insert_many(list(buckets.values()))
+    return len(buckets)
+
+async def run_backfill():
+    await connect_to_mongo()
+    print(f"Wrote {await backfill_rating_history()} rating history buckets")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(run_backfill())
@@ -1,20 +1,41 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
+from pymongo import ReturnDocument
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
 import models
 from database import connect_to_mongo, close_mongo_connection, get_database
+from events import hub, event_stream, AUDIENCE_ADMIN
+from ratelimit import rate_limit_middleware, limiter_stats
+from archive import (
+    ARCHIVE_COLLECTION,
+    archive_reviews,
+    restore_review,
+    start_archiver,
+    stop_archiver
+)
+from profiler import ProfilerMiddleware, profiler
+from compression import CompressionMiddleware, compression_stats
+from history import HISTORY_COLLECTION, normalize_day, record_moderation, get_rating_history
 from auth import (
     verify_password, 
     get_password_hash, 
     create_access_token,
     get_current_user,
+    get_current_stream_user,
     get_current_admin_user
 )
 
 app = FastAPI(title="AI Tool Discovery API", version="1.0")
 
+# Sampling profiler (innermost, so endpoint frames chain back to it)
+app.add_middleware(ProfilerMiddleware)
+
+# Rate limiting and load shedding (registered before CORS so CORS wraps its responses)
+app.middleware("http")(rate_limit_middleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,13 +45,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression (outermost, so it sees the final headers)
+app.add_middleware(CompressionMiddleware)
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_db_client():
     await connect_to_mongo()
+    await hub.start()
+    await start_archiver(recalculate_tool_rating)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_archiver()
+    await hub.stop()
     await close_mongo_connection()
 
 # Helper functions
@@ -76,10 +104,16 @@ async def recalculate_tool_rating(tool_id: str):
         "status": "approved"
     }).to_list(length=None)
     
-    if approved_reviews:
-        total_rating = sum(r["rating"] for r in approved_reviews)
-        average_rating = round(total_rating / len(approved_reviews), 1)
-        review_count = len(approved_reviews)
+    # Approved reviews moved to the archive are kept as totals on the tool
+    tool = await db.tools.find_one(
+        {"_id": ObjectId(tool_id)},
+        {"archived_rating_sum": 1, "archived_review_count": 1}
+    ) or {}
+    total_rating = sum(r["rating"] for r in approved_reviews) + tool.get("archived_rating_sum", 0)
+    review_count = len(approved_reviews) + tool.get("archived_review_count", 0)
+    
+    if review_count:
+        average_rating = round(total_rating / review_count, 1)
     else:
         average_rating = 0.0
         review_count = 0
@@ -231,6 +265,7 @@ async def create_tool(
     result = await db.tools.insert_one(tool_dict)
     new_tool = await db.tools.find_one({"_id": result.inserted_id})
     
+    await hub.publish("tool_created", tool_helper(new_tool))
     return tool_helper(new_tool)
 
 @app.put("/api/tools/{tool_id}", response_model=models.ToolResponse)
@@ -254,6 +289,7 @@ async def update_tool(
         raise HTTPException(status_code=404, detail="Tool not found")
     
     updated_tool = await db.tools.find_one({"_id": ObjectId(tool_id)})
+    await hub.publish("tool_updated", tool_helper(updated_tool))
     return tool_helper(updated_tool)
 
 @app.delete("/api/tools/{tool_id}")
@@ -267,13 +303,36 @@ async def delete_tool(
         raise HTTPException(status_code=400, detail="Invalid tool ID")
     
     await db.reviews.delete_many({"tool_id": tool_id})
+    await db[ARCHIVE_COLLECTION].delete_many({"tool_id": tool_id})
+    await db[HISTORY_COLLECTION].delete_many({"tool_id": tool_id})
     result = await db.tools.delete_one({"_id": ObjectId(tool_id)})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Tool not found")
     
+    await hub.publish("tool_deleted", {"id": tool_id})
     return {"message": "Tool deleted successfully"}
 
+@app.get("/api/tools/{tool_id}/history", response_model=List[models.RatingBucketResponse])
+async def get_tool_history(
+    tool_id: str,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a tool's daily rating history (Protected)"""
+    if not ObjectId.is_valid(tool_id):
+        raise HTTPException(status_code=400, detail="Invalid tool ID")
+    
+    try:
+        # Buckets are compared as text, so "2026-9-1" must become "2026-09-01"
+        date_from = normalize_day(date_from) if date_from else None
+        date_to = normalize_day(date_to) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    
+    return await get_rating_history(tool_id, date_from, date_to)
+
 # ===== REVIEW ROUTES =====
 
 @app.post("/api/reviews", response_model=models.ReviewResponse)
@@ -300,6 +359,10 @@ async def create_review(
     result = await db.reviews.insert_one(review_dict)
     new_review = await db.reviews.find_one({"_id": result.inserted_id})
     
+    # Pending reviews are only visible to moderators
+    await hub.publish(
+        "review_created", review_helper(new_review), audience=AUDIENCE_ADMIN
+    )
     return review_helper(new_review)
 
 @app.get("/api/reviews", response_model=List[models.ReviewResponse])
@@ -325,6 +388,36 @@ async def get_reviews(
     reviews = await db.reviews.find(query_filter).to_list(length=None)
     return [review_helper(review) for review in reviews]
 
+@app.get("/api/reviews/archive", response_model=List[models.ReviewResponse])
+async def get_archived_reviews(
+    tool_id: Optional[str] = None,
+    status: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Get archived reviews, newest first (Admin only)"""
+    db = get_database()
+    query_filter = {}
+    
+    if tool_id:
+        if not ObjectId.is_valid(tool_id):
+            raise HTTPException(status_code=400, detail="Invalid tool ID")
+        query_filter["tool_id"] = tool_id
+    
+    if status:
+        query_filter["status"] = status
+    
+    reviews = await db[ARCHIVE_COLLECTION].find(query_filter) \
+        .sort("date", -1).skip(skip).limit(limit).to_list(length=None)
+    return [review_helper(review) for review in reviews]
+
+@app.post("/api/reviews/archive")
+async def run_review_archival(current_user: dict = Depends(get_current_admin_user)):
+    """Move rejected and old reviews to the archive now (Admin only)"""
+    archived = await archive_reviews(recalculate_tool_rating)
+    return {"archived": archived}
+
 @app.patch("/api/reviews/{review_id}", response_model=models.ReviewResponse)
 async def moderate_review(
     review_id: str,
@@ -340,20 +433,74 @@ async def moderate_review(
     if action.status not in ["approved", "rejected"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    review = await db.reviews.find_one({"_id": ObjectId(review_id)})
+    # Read the previous status atomically with the update, so concurrent
+    # moderations of the same review each see the status they replaced
+    async def set_status():
+        return await db.reviews.find_one_and_update(
+            {"_id": ObjectId(review_id)},
+            {"$set": {"status": action.status}},
+            return_document=ReturnDocument.BEFORE
+        )
+    
+    review = await set_status()
+    if not review:
+        # Old pending reviews may have been archived before anyone moderated them
+        if await restore_review(ObjectId(review_id)):
+            review = await set_status()
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     
-    await db.reviews.update_one(
-        {"_id": ObjectId(review_id)},
-        {"$set": {"status": action.status}}
-    )
-    
+    await record_moderation(review, action.status)
     await recalculate_tool_rating(review["tool_id"])
     
     updated_review = await db.reviews.find_one({"_id": ObjectId(review_id)})
+    await hub.publish(
+        "review_moderated", review_helper(updated_review), audience=AUDIENCE_ADMIN
+    )
+    
+    # Approving or rejecting can change the tool's public rating
+    tool = await db.tools.find_one({"_id": ObjectId(review["tool_id"])})
+    if tool:
+        await hub.publish("tool_rating_updated", tool_helper(tool))
+    
     return review_helper(updated_review)
 
+# ===== EVENT ROUTES =====
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    current_user: dict = Depends(get_current_stream_user)
+):
+    """Stream rating, moderation and tool updates as server-sent events (Protected)
+
+    Browsers connect with `new EventSource(`/api/events?token=${token}`)`.
+    """
+    subscription = hub.subscribe(is_admin=current_user.get("role") == "admin")
+    return StreamingResponse(
+        event_stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ===== PROFILING ROUTES =====
+
+@app.get("/api/profiles")
+async def get_profiles(current_user: dict = Depends(get_current_admin_user)):
+    """List recent request profiles, newest first (Admin only)"""
+    return [profile.summary() for profile in reversed(profiler.profiles)]
+
+@app.get("/api/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: int,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Get a profile as folded stacks for flamegraph tools (Admin only)"""
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.collapsed()
+
 # ===== UTILITY ROUTES =====
 
 @app.get("/api/categories")
@@ -368,13 +515,25 @@ async def get_pricing_models():
 
 @app.get("/api/stats")
 async def get_stats(current_user: dict = Depends(get_current_admin_user)):
-    """Get platform statistics (Admin only)"""
+    """Get platform statistics (Admin only)
+
+    Review counts include archived reviews; `archived_reviews` is the part of
+    `total_reviews` held in the archive.
+    """
     db = get_database()
+    archive = db[ARCHIVE_COLLECTION]
     
     total_tools = await db.tools.count_documents({})
-    total_reviews = await db.reviews.count_documents({})
-    pending_reviews = await db.reviews.count_documents({"status": "pending"})
-    approved_reviews = await db.reviews.count_documents({"status": "approved"})
+    archived_reviews = await archive.estimated_document_count()
+    total_reviews = await db.reviews.count_documents({}) + archived_reviews
+    pending_reviews = (
+        await db.reviews.count_documents({"status": "pending"})
+        + await archive.count_documents({"status": "pending"})
+    )
+    approved_reviews = (
+        await db.reviews.count_documents({"status": "approved"})
+        + await archive.count_documents({"status": "approved"})
+    )
     total_users = await db.users.count_documents({})
     
     return {
@@ -382,9 +541,20 @@ async def get_stats(current_user: dict = Depends(get_current_admin_user)):
         "total_reviews": total_reviews,
         "pending_reviews": pending_reviews,
         "approved_reviews": approved_reviews,
+        "archived_reviews": archived_reviews,
         "total_users": total_users
     }
 
+@app.get("/api/stats/rate-limits")
+async def get_rate_limit_stats(current_user: dict = Depends(get_current_admin_user)):
+    """Get rate limiter decisions for this worker (Admin only)"""
+    return limiter_stats()
+
+@app.get("/api/stats/compression")
+async def get_compression_stats(current_user: dict = Depends(get_current_admin_user)):
+    """Get response compression counters for this worker (Admin only)"""
+    return compression_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,738 @@
+"""In-memory stand-in for the subset of Motor the app uses.
+
+Selected with DATABASE_BACKEND=memory. Data lives in the worker process only,
+so it is meant for hermetic tests, local demos and CPU profiling.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY_ERROR = 11000
+
+class _Missing:
+    """Marker for a field that is absent from a document"""
+    def __repr__(self):
+        return "MISSING"
+
+MISSING = _Missing()
+
+# ===== Value helpers =====
+
+def type_rank(value) -> int:
+    """Rank of a value's type in MongoDB's comparison order"""
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def sort_key(value):
+    """Key that orders mixed-type values the way MongoDB does"""
+    rank = type_rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if rank in (4, 5, 10):
+        return (rank, repr(value))
+    return (rank, value)
+
+def hashable(value):
+    """Hashable form of a value for index lookups"""
+    if value is MISSING:
+        return None
+    if isinstance(value, bool):
+        # Keep True/False apart from 1/0, which hash the same
+        return ("__bool__", value)
+    if isinstance(value, dict):
+        return ("__dict__", tuple((k, hashable(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("__list__", tuple(hashable(v) for v in value))
+    return value
+
+def copy_value(value):
+    """Copy nested dicts and lists so callers can't mutate stored documents"""
+    if isinstance(value, dict):
+        return {k: copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    return value
+
+def get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+def set_path(doc: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+# ===== Query matching =====
+
+def values_equal(value, expected) -> bool:
+    if value is MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return any(values_equal(v, expected) for v in value)
+    return type_rank(value) == type_rank(expected) and value == expected
+
+def compare(value, arg, op) -> bool:
+    if type_rank(value) != type_rank(arg):
+        return False
+    value, arg = sort_key(value), sort_key(arg)
+    if op == "$gt":
+        return value > arg
+    if op == "$gte":
+        return value >= arg
+    if op == "$lt":
+        return value < arg
+    return value <= arg
+
+def is_operator_dict(cond) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(k.startswith("$") for k in cond)
+
+def match_condition(value, cond) -> bool:
+    if not is_operator_dict(cond):
+        return values_equal(value, cond)
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = values_equal(value, arg)
+        elif op == "$ne":
+            ok = not values_equal(value, arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = compare(value, arg, op)
+        elif op == "$in":
+            ok = any(values_equal(value, v) for v in arg)
+        elif op == "$nin":
+            ok = not any(values_equal(value, v) for v in arg)
+        elif op == "$exists":
+            ok = (value is not MISSING) == bool(arg)
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported")
+        if not ok:
+            return False
+    return True
+
+def matches(doc: dict, query_filter: dict) -> bool:
+    for key, cond in query_filter.items():
+        if key == "$or":
+            if not any(matches(doc, f) for f in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, f) for f in cond):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, f) for f in cond):
+                return False
+        elif not match_condition(get_path(doc, key), cond):
+            return False
+    return True
+
+def project(doc: dict, projection) -> dict:
+    doc = copy_value(doc)
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        result = {k: doc[k] for k in fields if k in doc}
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    for k in fields:
+        doc.pop(k, None)
+    if not include_id:
+        doc.pop("_id", None)
+    return doc
+
+# ===== Updates =====
+
+def apply_update(doc: dict, update: dict, inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if path == "_id":
+                continue
+            if op in ("$set", "$setOnInsert"):
+                set_path(doc, path, copy_value(value))
+            elif op == "$inc":
+                current = get_path(doc, path)
+                set_path(doc, path, (0 if current is MISSING else current) + value)
+            elif op == "$unset":
+                parts = path.split(".")
+                parent = get_path(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+                if isinstance(parent, dict):
+                    parent.pop(parts[-1], None)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported")
+
+def upsert_seed(query_filter: dict) -> dict:
+    """Document fields implied by the equality parts of an upsert filter"""
+    doc = {}
+    for key, cond in query_filter.items():
+        if key.startswith("$"):
+            continue
+        if is_operator_dict(cond):
+            if "$eq" in cond:
+                set_path(doc, key, copy_value(cond["$eq"]))
+        else:
+            set_path(doc, key, copy_value(cond))
+    return doc
+
+# ===== Results =====
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+        self.acknowledged = True
+
+# ===== Indexes =====
+
+class Index:
+    """Hash index on the full key plus a sorted index on its first field"""
+
+    def __init__(self, name: str, fields: list, unique: bool = False):
+        self.name = name
+        self.fields = fields
+        self.unique = unique
+        self.multikey = False
+        self.entries = {}
+        self.by_first = {}
+        # Sorted sort keys of the distinct first-field values, for range scans
+        self.first_order = []
+        self.first_lookup = {}
+
+    def key(self, doc: dict) -> tuple:
+        return tuple(hashable(get_path(doc, f)) for f in self.fields)
+
+    def check_unique(self, doc: dict, doc_id):
+        if not self.unique:
+            return
+        existing = self.entries.get(self.key(doc))
+        if existing and existing != {doc_id}:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error index: {self.name} dup key: {self.key(doc)}",
+                DUPLICATE_KEY_ERROR
+            )
+
+    def add(self, doc: dict, doc_id):
+        first = get_path(doc, self.fields[0])
+        if isinstance(first, list):
+            # Array values would need one entry per element; fall back to scans
+            self.multikey = True
+        self.entries.setdefault(self.key(doc), set()).add(doc_id)
+        first_key = hashable(first)
+        ids = self.by_first.get(first_key)
+        if ids is None:
+            ids = self.by_first[first_key] = set()
+            order_key = sort_key(first)
+            if order_key not in self.first_lookup:
+                insort(self.first_order, order_key)
+            self.first_lookup[order_key] = first_key
+        ids.add(doc_id)
+
+    def remove(self, doc: dict, doc_id):
+        key = self.key(doc)
+        ids = self.entries.get(key)
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del self.entries[key]
+        first = get_path(doc, self.fields[0])
+        first_key = hashable(first)
+        ids = self.by_first.get(first_key)
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del self.by_first[first_key]
+                order_key = sort_key(first)
+                if self.first_lookup.get(order_key) == first_key:
+                    del self.first_lookup[order_key]
+                    del self.first_order[bisect_left(self.first_order, order_key)]
+
+    def lookup(self, cond):
+        """Candidate ids for a condition on the first field, or None if unusable"""
+        if self.multikey:
+            return None
+        if not is_operator_dict(cond):
+            return set(self.by_first.get(hashable(cond), ()))
+        if "$eq" in cond:
+            return set(self.by_first.get(hashable(cond["$eq"]), ()))
+        if "$in" in cond:
+            ids = set()
+            for value in cond["$in"]:
+                ids |= self.by_first.get(hashable(value), set())
+            return ids
+        bounds = {op: cond[op] for op in ("$gt", "$gte", "$lt", "$lte") if op in cond}
+        if not bounds:
+            return None
+        # Comparisons only match values of the same type, so stay inside its rank
+        rank = type_rank(next(iter(bounds.values())))
+        start = bisect_left(self.first_order, (rank,))
+        end = bisect_left(self.first_order, (rank + 1,))
+        if "$gte" in bounds:
+            start = max(start, bisect_left(self.first_order, sort_key(bounds["$gte"])))
+        if "$gt" in bounds:
+            start = max(start, bisect_right(self.first_order, sort_key(bounds["$gt"])))
+        if "$lt" in bounds:
+            end = min(end, bisect_left(self.first_order, sort_key(bounds["$lt"])))
+        if "$lte" in bounds:
+            end = min(end, bisect_right(self.first_order, sort_key(bounds["$lte"])))
+        ids = set()
+        for order_key in self.first_order[start:end]:
+            ids |= self.by_first[self.first_lookup[order_key]]
+        return ids
+
+# ===== Cursors =====
+
+class MemoryCursor:
+    """Lazy cursor supporting sort, skip, limit, to_list and async iteration"""
+
+    def __init__(self, producer):
+        self.producer = producer
+        self.sort_spec = []
+        self.skip_count = 0
+        self.limit_count = 0
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self.sort_spec = [(key_or_list, direction or 1)]
+        else:
+            self.sort_spec = list(key_or_list)
+        return self
+
+    def skip(self, count: int):
+        self.skip_count = count
+        return self
+
+    def limit(self, count: int):
+        self.limit_count = count
+        return self
+
+    def results(self) -> list:
+        docs = self.producer()
+        for field, direction in reversed(self.sort_spec):
+            docs.sort(key=lambda d: sort_key(get_path(d, field)), reverse=direction < 0)
+        docs = docs[self.skip_count:]
+        if self.limit_count:
+            docs = docs[:self.limit_count]
+        return docs
+
+    async def to_list(self, length=None):
+        docs = self.results()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.results():
+            yield doc
+
+# ===== Aggregation =====
+
+def evaluate(doc: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_path(doc, expression[1:])
+    if isinstance(expression, dict):
+        return {k: evaluate(doc, v) for k, v in expression.items()}
+    return expression
+
+def group(docs: list, spec: dict) -> list:
+    groups = {}
+    for doc in docs:
+        group_id = evaluate(doc, spec["_id"])
+        if group_id is MISSING:
+            group_id = None
+        key = hashable(group_id)
+        if key not in groups:
+            groups[key] = {"_id": group_id, "__count": {}}
+        state = groups[key]
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expression), = accumulator.items()
+            value = evaluate(doc, expression)
+            if op in ("$sum", "$avg"):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                state[field] = state.get(field, 0) + value
+                state["__count"][field] = state["__count"].get(field, 0) + 1
+            elif op in ("$min", "$max"):
+                if value is MISSING:
+                    continue
+                current = state.get(field, MISSING)
+                if current is MISSING or (
+                    sort_key(value) < sort_key(current) if op == "$min"
+                    else sort_key(value) > sort_key(current)
+                ):
+                    state[field] = value
+            elif op == "$first":
+                state.setdefault(field, None if value is MISSING else value)
+            elif op == "$last":
+                state[field] = None if value is MISSING else value
+            elif op == "$push":
+                state.setdefault(field, []).append(value)
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported")
+
+    results = []
+    for state in groups.values():
+        counts = state.pop("__count")
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            op = next(iter(accumulator))
+            if op == "$avg":
+                state[field] = state[field] / counts[field] if counts.get(field) else None
+            elif op == "$sum":
+                state.setdefault(field, 0)
+            elif op in ("$min", "$max"):
+                state.setdefault(field, None)
+        results.append(state)
+    return results
+
+def run_pipeline(docs: list, pipeline: list) -> list:
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = [d for d in docs if matches(d, spec)]
+        elif op == "$group":
+            docs = group(docs, spec)
+        elif op == "$sort":
+            for field, direction in reversed(list(spec.items())):
+                docs.sort(key=lambda d: sort_key(get_path(d, field)), reverse=direction < 0)
+        elif op == "$skip":
+            docs = docs[spec:]
+        elif op == "$limit":
+            docs = docs[:spec]
+        elif op == "$project":
+            docs = [project(d, spec) for d in docs]
+        elif op == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        else:
+            raise NotImplementedError(f"Aggregation stage {op} is not supported")
+    return docs
+
+# ===== Collections =====
+
+class MemoryCollection:
+    """Async collection mirroring the Motor methods used by the app"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents = {}
+        self.indexes = {}
+        # Insertion sequence per document, to return index hits in natural order
+        self.sequence = {}
+        self.next_sequence = 0
+
+    # Internal helpers
+
+    def _candidates(self, query_filter: dict):
+        """Ids worth checking for a filter, or None when a full scan is needed"""
+        best = None
+        for key, cond in query_filter.items():
+            if key == "$or":
+                ids = set()
+                for branch in cond:
+                    branch_ids = self._candidates(branch)
+                    if branch_ids is None:
+                        ids = None
+                        break
+                    ids |= branch_ids
+            elif key == "$and":
+                ids = None
+                for branch in cond:
+                    ids = self._candidates(branch)
+                    if ids is not None:
+                        break
+            elif key.startswith("$"):
+                ids = None
+            elif key == "_id":
+                if is_operator_dict(cond):
+                    if "$eq" in cond:
+                        ids = {hashable(cond["$eq"])}
+                    elif "$in" in cond:
+                        ids = {hashable(v) for v in cond["$in"]}
+                    else:
+                        ids = None
+                else:
+                    ids = {hashable(cond)}
+            else:
+                ids = None
+                for index in self.indexes.values():
+                    if index.fields[0] == key:
+                        ids = index.lookup(cond)
+                        if ids is not None:
+                            break
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _find_ids(self, query_filter: dict) -> list:
+        query_filter = query_filter or {}
+        candidates = self._candidates(query_filter)
+        if candidates is None:
+            items = self.documents.items()
+        else:
+            found = sorted(
+                (doc_id for doc_id in candidates if doc_id in self.documents),
+                key=self.sequence.__getitem__
+            )
+            items = ((doc_id, self.documents[doc_id]) for doc_id in found)
+        return [doc_id for doc_id, doc in items if matches(doc, query_filter)]
+
+    def _store(self, doc: dict):
+        doc_id = hashable(doc["_id"])
+        if doc_id in self.documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} dup key: {doc_id}",
+                DUPLICATE_KEY_ERROR
+            )
+        for index in self.indexes.values():
+            index.check_unique(doc, doc_id)
+        self.documents[doc_id] = doc
+        self.sequence[doc_id] = self.next_sequence
+        self.next_sequence += 1
+        for index in self.indexes.values():
+            index.add(doc, doc_id)
+
+    def _replace(self, doc_id, new_doc: dict):
+        old_doc = self.documents[doc_id]
+        for index in self.indexes.values():
+            index.remove(old_doc, doc_id)
+        try:
+            for index in self.indexes.values():
+                index.check_unique(new_doc, doc_id)
+        except DuplicateKeyError:
+            for index in self.indexes.values():
+                index.add(old_doc, doc_id)
+            raise
+        self.documents[doc_id] = new_doc
+        for index in self.indexes.values():
+            index.add(new_doc, doc_id)
+
+    def _delete(self, doc_id):
+        doc = self.documents.pop(doc_id)
+        del self.sequence[doc_id]
+        for index in self.indexes.values():
+            index.remove(doc, doc_id)
+
+    def _upsert(self, query_filter: dict, update: dict):
+        doc = upsert_seed(query_filter)
+        apply_update(doc, update, inserting=True)
+        doc.setdefault("_id", ObjectId())
+        self._store(doc)
+        return doc
+
+    # Motor API
+
+    def find(self, query_filter: dict = None, projection=None) -> MemoryCursor:
+        def producer():
+            return [
+                project(self.documents[doc_id], projection)
+                for doc_id in self._find_ids(query_filter)
+            ]
+        return MemoryCursor(producer)
+
+    async def find_one(self, query_filter: dict = None, projection=None):
+        for doc_id in self._find_ids(query_filter):
+            return project(self.documents[doc_id], projection)
+        return None
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        self._store(copy_value(document))
+        return InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents: list, ordered: bool = True) -> InsertManyResult:
+        inserted_ids, write_errors = [], []
+        for position, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            try:
+                self._store(copy_value(document))
+            except DuplicateKeyError as e:
+                write_errors.append({
+                    "index": position,
+                    "code": DUPLICATE_KEY_ERROR,
+                    "errmsg": str(e),
+                    "op": document
+                })
+                if ordered:
+                    break
+                continue
+            inserted_ids.append(document["_id"])
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": write_errors,
+                "writeConcernErrors": [],
+                "nInserted": len(inserted_ids),
+                "nUpserted": 0,
+                "nMatched": 0,
+                "nModified": 0,
+                "nRemoved": 0,
+                "upserted": []
+            })
+        return InsertManyResult(inserted_ids)
+
+    async def update_one(self, query_filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        for doc_id in self._find_ids(query_filter):
+            old_doc = self.documents[doc_id]
+            new_doc = copy_value(old_doc)
+            apply_update(new_doc, update)
+            if new_doc == old_doc:
+                return UpdateResult(1, 0)
+            self._replace(doc_id, new_doc)
+            return UpdateResult(1, 1)
+        if upsert:
+            doc = self._upsert(query_filter, update)
+            return UpdateResult(0, 0, doc["_id"])
+        return UpdateResult(0, 0)
+
+    async def update_many(self, query_filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        doc_ids = self._find_ids(query_filter)
+        modified = 0
+        for doc_id in doc_ids:
+            old_doc = self.documents[doc_id]
+            new_doc = copy_value(old_doc)
+            apply_update(new_doc, update)
+            if new_doc != old_doc:
+                self._replace(doc_id, new_doc)
+                modified += 1
+        if not doc_ids and upsert:
+            doc = self._upsert(query_filter, update)
+            return UpdateResult(0, 0, doc["_id"])
+        return UpdateResult(len(doc_ids), modified)
+
+    async def find_one_and_update(
+        self,
+        query_filter: dict,
+        update: dict,
+        projection=None,
+        upsert: bool = False,
+        return_document=ReturnDocument.BEFORE
+    ):
+        for doc_id in self._find_ids(query_filter):
+            old_doc = self.documents[doc_id]
+            new_doc = copy_value(old_doc)
+            apply_update(new_doc, update)
+            self._replace(doc_id, new_doc)
+            result = new_doc if return_document == ReturnDocument.AFTER else old_doc
+            return project(result, projection)
+        if upsert:
+            doc = self._upsert(query_filter, update)
+            return project(doc, projection) if return_document == ReturnDocument.AFTER else None
+        return None
+
+    async def delete_one(self, query_filter: dict) -> DeleteResult:
+        for doc_id in self._find_ids(query_filter):
+            self._delete(doc_id)
+            return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def delete_many(self, query_filter: dict) -> DeleteResult:
+        doc_ids = self._find_ids(query_filter)
+        for doc_id in doc_ids:
+            self._delete(doc_id)
+        return DeleteResult(len(doc_ids))
+
+    async def count_documents(self, query_filter: dict) -> int:
+        if not query_filter:
+            return len(self.documents)
+        return len(self._find_ids(query_filter))
+
+    async def estimated_document_count(self) -> int:
+        return len(self.documents)
+
+    async def create_index(self, keys, unique: bool = False, **kwargs) -> str:
+        """Create an index; options such as expireAfterSeconds are accepted but not enforced"""
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = kwargs.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if name in self.indexes:
+            return name
+        index = Index(name, [field for field, _ in keys], unique=unique)
+        for doc_id, doc in self.documents.items():
+            index.check_unique(doc, doc_id)
+            index.add(doc, doc_id)
+        self.indexes[name] = index
+        return name
+
+    def aggregate(self, pipeline: list) -> MemoryCursor:
+        def producer():
+            stages = list(pipeline)
+            # A leading $match can use the indexes
+            query_filter = stages.pop(0)["$match"] if stages and "$match" in stages[0] else {}
+            docs = [copy_value(self.documents[doc_id]) for doc_id in self._find_ids(query_filter)]
+            return run_pipeline(docs, stages)
+        return MemoryCursor(producer)
+
+    def watch(self, *args, **kwargs):
+        raise NotImplementedError("Change streams are not supported by the in-memory backend")
+
+class MemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+class MemoryClient:
+    """Drop-in replacement for AsyncIOMotorClient"""
+
+    def __init__(self):
+        self.databases = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self.databases:
+            self.databases[name] = MemoryDatabase(name)
+        return self.databases[name]
+
+    def close(self):
+        pass
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import Optional
+from typing import Optional, Dict
 from bson import ObjectId
 from enum import Enum
 from datetime import datetime
@@ -151,4 +151,13 @@ class ReviewResponse(BaseModel):
     )
 
 class ReviewAction(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+# ===== Rating History Models =====
+class RatingBucketResponse(BaseModel):
+    day: str
+    count: int
+    sum: int
+    stars: Dict[str, int]
+    total_count: int
+    average_rating: float
@@ -0,0 +1,180 @@
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from auth import token_subject
+
+# Profiler settings
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.001"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+# Admins can force a profile for a single request with this header
+PROFILE_HEADER = b"x-profile"
+# Long-lived streaming routes are never profiled; the sampler would stay on
+# (and the switch interval shortened) for as long as the client is connected
+PROFILE_EXCLUDED_PATHS = {"/api/events"}
+STREAMING_TYPES = (b"text/event-stream",)
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profile:
+    """Stack samples collected while one request was being handled"""
+
+    def __init__(self, profile_id: int, method: str, path: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.status_code = None
+        self.duration_ms = 0.0
+        self.stacks: Counter = Counter()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": sum(self.stacks.values()),
+            "interval_ms": PROFILE_INTERVAL_SECONDS * 1000
+        }
+
+    def collapsed(self) -> str:
+        """Folded stacks, one "frame;frame;frame count" line per stack"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack while profiled requests are in flight
+
+    A sample is credited to a request when the request's middleware frame is on
+    the sampled stack, so concurrent requests don't pollute each other's profile.
+    The sampler thread sleeps whenever no profiled request is running, and the
+    GIL switch interval is only shortened (so the sampler gets to run) while one is.
+    """
+
+    def __init__(self, interval: float, capacity: int):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.profiles = deque(maxlen=capacity)
+        self.ids = itertools.count(1)
+        self.thread = None
+        self.target_thread_id = None
+        self.switch_interval = None
+
+    def begin(self, frame, profile: Profile):
+        with self.lock:
+            self.target_thread_id = threading.get_ident()
+            if not self.active:
+                self.switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.switch_interval, self.interval))
+            self.active[frame] = profile
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self.thread.start()
+            self.wake.set()
+
+    def end(self, frame):
+        with self.lock:
+            profile = self.active.pop(frame)
+            if not self.active:
+                self.wake.clear()
+                sys.setswitchinterval(self.switch_interval)
+        self.profiles.append(profile)
+
+    def get(self, profile_id: int):
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            self._sample()
+
+    def _sample(self):
+        with self.lock:
+            active = dict(self.active)
+        frame = sys._current_frames().get(self.target_thread_id)
+        stack = []
+        while frame is not None:
+            profile = active.get(frame)
+            if profile is not None:
+                profile.stacks[";".join(reversed(stack))] += 1
+                return
+            stack.append(frame_label(frame))
+            frame = frame.f_back
+
+profiler = SamplingProfiler(PROFILE_INTERVAL_SECONDS, PROFILE_BUFFER_SIZE)
+
+async def is_admin_request(headers: dict) -> bool:
+    """Check the bearer token belongs to an admin (only called when the profile header is set)"""
+    from database import get_database
+    from bson import ObjectId
+
+    user_id = token_subject(headers.get(b"authorization", b"").decode("latin-1"))
+    if not user_id or not ObjectId.is_valid(user_id):
+        return False
+    user = await get_database().users.find_one({"_id": ObjectId(user_id)}, {"role": 1})
+    return bool(user) and user.get("role") == "admin"
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling a sample of requests
+
+    Kept as plain ASGI (not BaseHTTPMiddleware) so the endpoint runs in the same
+    task and its frames chain back to this middleware's frame.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in PROFILE_EXCLUDED_PATHS:
+            return await self.app(scope, receive, send)
+
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        if not sampled and any(name == PROFILE_HEADER for name, _ in scope["headers"]):
+            sampled = await is_admin_request(dict(scope["headers"]))
+        if not sampled:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(next(profiler.ids), scope["method"], scope["path"])
+        frame = sys._getframe()
+        start = time.perf_counter()
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if not finished:
+                finished = True
+                profile.duration_ms = (time.perf_counter() - start) * 1000
+                profiler.end(frame)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                headers = list(message.get("headers", []))
+                message["headers"] = headers + [(b"x-profile-id", str(profile.id).encode())]
+                # Stop sampling once a response turns out to be a stream
+                for name, value in headers:
+                    if name.lower() == b"content-type" and value.startswith(STREAMING_TYPES):
+                        finish()
+            await send(message)
+
+        profiler.begin(frame, profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            finish()
@@ -0,0 +1,530 @@
+"""Check that every query shape the API issues is served by an index.
+
+Creates a scratch database on a local mongod with the app's own indexes, seeds
+it with synthetic data, runs explain("executionStats") for each query shape and
+reports the winning plan, docsExamined/nReturned and execution time. Shapes that
+do a COLLSCAN or examine far more documents than they return are flagged with a
+suggested compound index. Exits with status 1 when a shape is flagged that is not
+listed in the baseline file, so it can guard CI against query-plan regressions.
+
+    python query_plan_check.py --tools 2000 --reviews 20000
+    python query_plan_check.py --update-baseline   # accept the current flags
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+import database
+from archive import ARCHIVE_COLLECTION, archive_filter, create_archive_indexes
+from history import HISTORY_COLLECTION
+
+PLAN_CHECK_DATABASE = "ai_tools_db_plan_check"
+# The configured application database, captured before run() overrides it
+APP_DATABASE = database.DATABASE_NAME
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baseline.txt")
+
+CATEGORIES = ["NLP", "Computer Vision", "Dev Tools", "Audio", "Video", "Data Analytics"]
+PRICING_MODELS = ["Free", "Paid", "Subscription"]
+STATUSES = ["pending", "approved", "approved", "approved", "rejected"]
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+# ===== Seeding =====
+
+def days_ago(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+def random_day(days_back: int) -> str:
+    return days_ago(random.randint(0, days_back))
+
+async def seed(db, tool_count: int, review_count: int, user_count: int) -> dict:
+    """Insert synthetic data and return sample values for the query shapes"""
+    tools = [
+        {
+            "name": f"Tool {i}",
+            "use_case": "Synthetic tool",
+            "category": random.choice(CATEGORIES),
+            "pricing_model": random.choice(PRICING_MODELS),
+            "average_rating": round(random.uniform(0, 5), 1),
+            "review_count": 0
+        }
+        for i in range(tool_count)
+    ]
+    tool_ids = [str(tool_id) for tool_id in (await db.tools.insert_many(tools)).inserted_ids]
+
+    users = [
+        {
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "hashed_password": "",
+            "role": "user",
+            "created_at": datetime.utcnow()
+        }
+        for i in range(user_count)
+    ]
+    user_ids = (await db.users.insert_many(users)).inserted_ids
+
+    reviews = [
+        {
+            "tool_id": random.choice(tool_ids),
+            "tool_name": "Tool",
+            "user_id": str(random.choice(user_ids)),
+            "rating": random.randint(1, 5),
+            "comment": "Synthetic review",
+            "status": random.choice(STATUSES),
+            "date": random_day(730)
+        }
+        for _ in range(review_count)
+    ]
+    for start in range(0, len(reviews), 5000):
+        await db.reviews.insert_many(reviews[start:start + 5000])
+
+    # A slice of the reviews as they would look after archival, the last batch
+    # still waiting for its tool totals to be refreshed
+    archived = [{**review, "_id": ObjectId()} for review in reviews[:review_count // 5]]
+    for review in archived[-10:]:
+        review["totals_pending"] = True
+    if archived:
+        await db[ARCHIVE_COLLECTION].insert_many(archived)
+
+    buckets = {}
+    for review in reviews:
+        if review["status"] == "approved":
+            key = (review["tool_id"], review["date"])
+            bucket = buckets.setdefault(key, {"tool_id": key[0], "day": key[1], "count": 0, "sum": 0})
+            bucket["count"] += 1
+            bucket["sum"] += review["rating"]
+    if buckets:
+        await db[HISTORY_COLLECTION].insert_many(list(buckets.values()))
+
+    return {
+        "tool_id": random.choice(tool_ids),
+        "tool_ids": random.sample(tool_ids, min(10, len(tool_ids))),
+        "review_id": (await db.reviews.find_one({}))["_id"],
+        # One archival batch worth of ids
+        "review_ids": [review["_id"] for review in reviews[:500]],
+        "archived_ids": [review["_id"] for review in archived[:500]] or [ObjectId()],
+        "user_id": random.choice(user_ids),
+        "email": "user0@example.com"
+    }
+
+# ===== Query shapes =====
+
+def count_pipeline(query_filter: dict) -> list:
+    """The pipeline count_documents sends for a filter"""
+    return [{"$match": query_filter}, {"$group": {"_id": 1, "n": {"$sum": 1}}}]
+
+def query_shapes(sample: dict) -> list:
+    """Every query shape issued by main.py and its helper modules
+
+    `full_scan` marks shapes that read a whole collection by design. Updates
+    and deletes are explained as finds with the same filter: the planner picks
+    the same plan, and only a find reports how many documents matched. Inserts,
+    estimated_document_count (collection metadata) and the events change stream
+    run no query plan and are left out.
+    """
+    tool_id = sample["tool_id"]
+    review_ids = sample["review_ids"]
+    archived_ids = sample["archived_ids"]
+    shapes = []
+
+    # get_tools: every combination of its optional filters
+    for category in (None, "NLP"):
+        for pricing in (None, "Paid"):
+            for min_rating in (None, 4.0):
+                query_filter = {}
+                if category:
+                    query_filter["category"] = category
+                if pricing:
+                    query_filter["pricing_model"] = pricing
+                if min_rating is not None:
+                    query_filter["average_rating"] = {"$gte": min_rating}
+                label = "+".join(query_filter) or "no filter"
+                shapes.append({
+                    "name": f"get_tools ({label})",
+                    "collection": "tools",
+                    "filter": query_filter,
+                    "full_scan": not query_filter
+                })
+
+    # get_archived_reviews: every combination of its optional filters
+    for archived_tool in (None, tool_id):
+        for status in (None, "approved"):
+            query_filter = {}
+            if archived_tool:
+                query_filter["tool_id"] = archived_tool
+            if status:
+                query_filter["status"] = status
+            label = "+".join(query_filter) or "no filter"
+            shapes.append({
+                "name": f"get_archived_reviews ({label})",
+                "collection": ARCHIVE_COLLECTION,
+                "filter": query_filter,
+                "sort": {"date": -1},
+                "limit": 100
+            })
+
+    backfill_pipeline = [
+        {"$match": {"status": "approved"}},
+        {"$group": {
+            "_id": {"tool_id": "$tool_id", "day": "$date", "rating": "$rating"},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+    shapes += [
+        # Tools
+        {"name": "get_tool / update_tool / delete_tool / recalculate", "collection": "tools",
+         "filter": {"_id": ObjectId(tool_id)}},
+
+        # Hot reviews
+        {"name": "get_reviews (status)", "collection": "reviews",
+         "filter": {"status": "approved"}},
+        {"name": "get_reviews (tool_id+status)", "collection": "reviews",
+         "filter": {"tool_id": tool_id, "status": "approved"}},
+        {"name": "recalculate_tool_rating", "collection": "reviews",
+         "filter": {"tool_id": tool_id, "status": "approved"}},
+        {"name": "moderate_review", "collection": "reviews",
+         "filter": {"_id": sample["review_id"]}},
+        {"name": "delete_tool cascade (reviews)", "collection": "reviews",
+         "filter": {"tool_id": tool_id}},
+        {"name": "archive_batch (select)", "collection": "reviews",
+         "filter": archive_filter(180), "limit": 500},
+        {"name": "archive_batch (status-guarded delete)", "collection": "reviews",
+         "filter": {"_id": {"$in": review_ids}, "status": "approved"}},
+        {"name": "archive_batch (moderated mid-batch)", "collection": "reviews",
+         "filter": {"_id": {"$in": review_ids}, "status": {"$ne": "approved"}}},
+
+        # Archived reviews
+        {"name": "archive_batch (drop stale copies)", "collection": ARCHIVE_COLLECTION,
+         "filter": {"_id": {"$in": archived_ids}}},
+        {"name": "settle_pending_totals", "collection": ARCHIVE_COLLECTION,
+         "filter": {"totals_pending": True}},
+        {"name": "settle_pending_totals (clear flags)", "collection": ARCHIVE_COLLECTION,
+         "filter": {"_id": {"$in": archived_ids}}},
+        {"name": "refresh_archived_totals", "collection": ARCHIVE_COLLECTION,
+         "pipeline": [
+             {"$match": {"tool_id": {"$in": sample["tool_ids"]}, "status": "approved"}},
+             {"$group": {"_id": "$tool_id", "sum": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+         ]},
+        {"name": "restore_review", "collection": ARCHIVE_COLLECTION,
+         "filter": {"_id": archived_ids[0]}},
+        {"name": "delete_tool cascade (archive)", "collection": ARCHIVE_COLLECTION,
+         "filter": {"tool_id": tool_id}},
+
+        # Stats
+        {"name": "get_stats total_tools", "collection": "tools",
+         "pipeline": count_pipeline({}), "full_scan": True},
+        {"name": "get_stats total_reviews", "collection": "reviews",
+         "pipeline": count_pipeline({}), "full_scan": True},
+        {"name": "get_stats pending_reviews", "collection": "reviews",
+         "pipeline": count_pipeline({"status": "pending"})},
+        {"name": "get_stats approved_reviews", "collection": "reviews",
+         "pipeline": count_pipeline({"status": "approved"})},
+        {"name": "get_stats pending_reviews (archive)", "collection": ARCHIVE_COLLECTION,
+         "pipeline": count_pipeline({"status": "pending"})},
+        {"name": "get_stats approved_reviews (archive)", "collection": ARCHIVE_COLLECTION,
+         "pipeline": count_pipeline({"status": "approved"})},
+        {"name": "get_stats total_users", "collection": "users",
+         "pipeline": count_pipeline({}), "full_scan": True},
+
+        # Users and auth
+        {"name": "login / register", "collection": "users",
+         "filter": {"email": sample["email"]}},
+        {"name": "get_current_user / profiler admin check", "collection": "users",
+         "filter": {"_id": sample["user_id"]}},
+        {"name": "rate limiter (mongo backend)", "collection": "rate_limits",
+         "filter": {"_id": "ip:127.0.0.1:0"}},
+
+        # Rating history
+        {"name": "record_moderation", "collection": HISTORY_COLLECTION,
+         "filter": {"tool_id": tool_id, "day": days_ago(0)}},
+        {"name": "get_rating_history (range)", "collection": HISTORY_COLLECTION,
+         "filter": {"tool_id": tool_id, "day": {"$gte": days_ago(365), "$lte": days_ago(30)}},
+         "sort": {"day": 1}},
+        {"name": "get_rating_history (seed totals)", "collection": HISTORY_COLLECTION,
+         "pipeline": [
+             {"$match": {"tool_id": tool_id, "day": {"$lt": days_ago(365)}}},
+             {"$group": {"_id": None, "count": {"$sum": "$count"}, "sum": {"$sum": "$sum"}}}
+         ]},
+        {"name": "delete_tool cascade (history)", "collection": HISTORY_COLLECTION,
+         "filter": {"tool_id": tool_id}},
+        {"name": "backfill_rating_history (reviews)", "collection": "reviews",
+         "pipeline": backfill_pipeline},
+        {"name": "backfill_rating_history (archive)", "collection": ARCHIVE_COLLECTION,
+         "pipeline": backfill_pipeline},
+    ]
+    return shapes
+
+def explain_command(shape: dict) -> dict:
+    if "pipeline" in shape:
+        command = {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}}
+    else:
+        command = {"find": shape["collection"], "filter": shape["filter"]}
+        if shape.get("sort"):
+            command["sort"] = shape["sort"]
+        if shape.get("limit"):
+            command["limit"] = shape["limit"]
+    return {"explain": command, "verbosity": "executionStats"}
+
+# ===== Plan analysis =====
+
+def find_values(node, key: str) -> list:
+    """All values stored under `key` anywhere in an explain document"""
+    found = []
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                found.append(v)
+            found.extend(find_values(v, key))
+    elif isinstance(node, list):
+        for item in node:
+            found.extend(find_values(item, key))
+    return found
+
+def winning_plans(explain: dict) -> list:
+    """Winning plans, including the one inside an aggregation's $cursor stage"""
+    return find_values(explain, "winningPlan")
+
+def plan_stages(explain: dict) -> list:
+    stages = []
+    for plan in winning_plans(explain):
+        stages.extend(find_values(plan, "stage"))
+    return stages
+
+def plan_indexes(explain: dict) -> list:
+    names = []
+    for plan in winning_plans(explain):
+        names.extend(find_values(plan, "indexName"))
+    return sorted(set(names))
+
+def execution_stats(explain: dict) -> dict:
+    """Totals from the first executionStats block (the query's own stats)"""
+    stats = find_values(explain, "executionStats")
+    if not stats:
+        return {"docs_examined": 0, "keys_examined": 0, "returned": 0, "millis": 0}
+    stats = stats[0]
+    return {
+        "docs_examined": stats.get("totalDocsExamined", 0),
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "returned": stats.get("nReturned", 0),
+        "millis": stats.get("executionTimeMillis", 0)
+    }
+
+def find_nodes(node, predicate) -> list:
+    """All dicts anywhere in an explain document that satisfy `predicate`"""
+    found = []
+    if isinstance(node, dict):
+        if predicate(node):
+            found.append(node)
+        for value in node.values():
+            found.extend(find_nodes(value, predicate))
+    elif isinstance(node, list):
+        for item in node:
+            found.extend(find_nodes(item, predicate))
+    return found
+
+def is_grouped(shape: dict) -> bool:
+    return any("$group" in stage for stage in shape.get("pipeline", []))
+
+def group_input_count(explain: dict, returned: int):
+    """Documents fed into a $group, i.e. returned by the $match input stage
+
+    When the $group runs in the pipeline, the query's own stats already count
+    the matched documents. When it is pushed down into the query plan, nReturned
+    is the number of groups, so the GROUP stage's input is used instead. Returns
+    None when that input cannot be found.
+    """
+    groups = []
+    for stages in find_values(explain, "executionStages"):
+        groups.extend(find_nodes(stages, lambda node: str(node.get("stage", "")).lower() == "group"))
+    if not groups:
+        return returned
+    input_stage = groups[0].get("inputStage")
+    if not isinstance(input_stage, dict) or "nReturned" not in input_stage:
+        return None
+    return input_stage["nReturned"]
+
+def shape_filter(shape: dict) -> dict:
+    if "pipeline" in shape:
+        first = shape["pipeline"][0]
+        return first.get("$match", {})
+    return shape.get("filter", {})
+
+def recommend_indexes(query_filter: dict, sort: dict = None) -> list:
+    """Compound indexes following the equality, sort, range rule"""
+    if "$or" in query_filter:
+        recommendations = []
+        for branch in query_filter["$or"]:
+            recommendations.extend(recommend_indexes(branch, sort))
+        return recommendations
+
+    equality, ranges = [], []
+    for field, cond in query_filter.items():
+        if field.startswith("$") or field == "_id":
+            continue
+        if isinstance(cond, dict) and set(cond) & RANGE_OPERATORS:
+            ranges.append(field)
+        else:
+            equality.append(field)
+
+    keys = [(field, 1) for field in equality]
+    for field, direction in (sort or {}).items():
+        if field not in equality:
+            keys.append((field, direction))
+    keys += [(field, 1) for field in ranges if field not in dict(keys)]
+    return [keys] if keys else []
+
+def format_index(collection: str, keys: list) -> str:
+    spec = ", ".join(f'("{field}", {"ASCENDING" if direction == 1 else "DESCENDING"})' for field, direction in keys)
+    return f"database.{collection}.create_index([{spec}])"
+
+def analyze(shape: dict, explain: dict, max_ratio: float) -> dict:
+    stages = plan_stages(explain)
+    stats = execution_stats(explain)
+    # A grouped shape returns one document per group, so compare against its input
+    returned = stats["returned"]
+    if is_grouped(shape):
+        returned = group_input_count(explain, returned)
+    ratio = None if returned is None else stats["docs_examined"] / max(returned, 1)
+
+    problems = []
+    if "COLLSCAN" in stages and not shape.get("full_scan"):
+        problems.append("COLLSCAN")
+    if ratio is not None and ratio > max_ratio and not shape.get("full_scan"):
+        problems.append(f"docsExamined/nReturned {ratio:.1f} > {max_ratio}")
+    if "SORT" in stages and shape.get("sort"):
+        problems.append("in-memory SORT")
+
+    recommendations = []
+    if problems:
+        recommendations = [
+            format_index(shape["collection"], keys)
+            for keys in recommend_indexes(shape_filter(shape), shape.get("sort"))
+        ]
+    elif shape.get("full_scan") and "pipeline" in shape and shape_filter(shape) == {}:
+        recommendations = [f"use estimated_document_count() on {shape['collection']}"]
+
+    return {
+        "name": shape["name"],
+        "stages": stages,
+        "indexes": plan_indexes(explain),
+        "ratio": ratio,
+        "problems": problems,
+        "recommendations": recommendations,
+        **stats
+    }
+
+def print_report(results: list):
+    print(f"{'query shape':<42} {'plan':<28} {'docs':>7} {'keys':>7} {'ret':>6} {'ratio':>7} {'ms':>5}")
+    for result in results:
+        plan = ">".join(dict.fromkeys(reversed(result["stages"])))[:28]
+        flag = "  <-- " + ", ".join(result["problems"]) if result["problems"] else ""
+        ratio = "-" if result["ratio"] is None else f"{result['ratio']:.1f}"
+        print(
+            f"{result['name'][:42]:<42} {plan:<28} {result['docs_examined']:>7} "
+            f"{result['keys_examined']:>7} {result['returned']:>6} {ratio:>7} "
+            f"{result['millis']:>5}{flag}"
+        )
+
+    recommendations = {}
+    for result in results:
+        for recommendation in result["recommendations"]:
+            recommendations.setdefault(recommendation, []).append(result["name"])
+    if recommendations:
+        print("\nRecommendations:")
+        for recommendation, names in recommendations.items():
+            print(f"  {recommendation}\n      for: {', '.join(names)}")
+
+# ===== Runner =====
+
+def load_baseline(path: str) -> set:
+    """Names of shapes already known to be flagged, one per line"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip() and not line.startswith("#")}
+
+def write_baseline(path: str, flagged: list):
+    with open(path, "w") as f:
+        f.write("# Query shapes accepted as flagged by query_plan_check.py\n")
+        for result in flagged:
+            f.write(f"{result['name']}\n")
+
+def dump_explain(directory: str, shape: dict, explain: dict):
+    """Save a raw explain document, e.g. to turn into a test fixture"""
+    os.makedirs(directory, exist_ok=True)
+    name = re.sub(r"[^a-z0-9]+", "_", shape["name"].lower()).strip("_")
+    with open(os.path.join(directory, f"{name}.json"), "w") as f:
+        json.dump(explain, f, indent=2, default=str)
+
+async def run(args) -> int:
+    # run() drops the database it seeds, so never point it at the app's own
+    if args.database == APP_DATABASE:
+        print(f"Refusing to use the application database '{APP_DATABASE}'; pass a scratch --database")
+        return 2
+
+    database.MONGODB_URL = args.url
+    database.DATABASE_NAME = args.database
+    await database.connect_to_mongo()
+    await database.client.drop_database(args.database)
+    await database.close_mongo_connection()
+
+    # Reconnect so the app's own indexes are built on the fresh database
+    await database.connect_to_mongo()
+    await create_archive_indexes()
+    db = database.get_database()
+
+    results = []
+    try:
+        sample = await seed(db, args.tools, args.reviews, args.users)
+        for shape in query_shapes(sample):
+            explain = await db.command(explain_command(shape))
+            if args.dump_explains:
+                dump_explain(args.dump_explains, shape, explain)
+            results.append(analyze(shape, explain, args.max_ratio))
+        print_report(results)
+    finally:
+        if not args.keep:
+            await database.client.drop_database(args.database)
+        await database.close_mongo_connection()
+
+    flagged = [result for result in results if result["problems"]]
+    if args.update_baseline:
+        write_baseline(args.baseline, flagged)
+        print(f"\nWrote {len(flagged)} flagged query shapes to {args.baseline}")
+        return 0
+
+    # Only shapes that are not already in the baseline fail the run
+    baseline = load_baseline(args.baseline)
+    new = [result for result in flagged if result["name"] not in baseline]
+    fixed = baseline - {result["name"] for result in flagged}
+    print(f"\n{len(flagged)} of {len(results)} query shapes flagged, {len(new)} not in the baseline")
+    for name in sorted(fixed):
+        print(f"  no longer flagged, remove from the baseline: {name}")
+    return 1 if new else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=database.MONGODB_URL)
+    parser.add_argument("--database", default=PLAN_CHECK_DATABASE)
+    parser.add_argument("--tools", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--max-ratio", type=float, default=4.0,
+                        help="flag shapes examining more than this many docs per doc returned")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="file of shape names whose flags are accepted")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write the currently flagged shapes to the baseline and exit 0")
+    parser.add_argument("--dump-explains", metavar="DIR",
+                        help="save each raw explain document as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    random.seed(0)
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,210 @@
+import asyncio
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from auth import token_subject
+
+# Rate limit settings (requests per second and burst size)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "20"))
+IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "40"))
+USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "10"))
+USER_BURST = int(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+AUTH_RATE = float(os.getenv("RATE_LIMIT_AUTH_RATE", "0.2"))
+AUTH_BURST = int(os.getenv("RATE_LIMIT_AUTH_BURST", "10"))
+# Seconds a request may wait for a concurrency slot before being shed
+QUEUE_TIMEOUT = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT", "0.5"))
+# "memory" keeps buckets per worker, "mongo" shares counters across workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+TRUST_PROXY = os.getenv("TRUST_PROXY", "0") == "1"
+MAX_TRACKED_KEYS = 10000
+
+# Routes that trigger bcrypt work
+AUTH_ROUTES = {
+    ("POST", "/api/auth/login"),
+    ("POST", "/api/auth/register"),
+}
+
+# Maximum in-flight requests per worker for expensive routes
+CONCURRENCY_LIMITS = {
+    ("POST", "/api/auth/login"): 4,
+    ("POST", "/api/auth/register"): 4,
+    ("GET", "/api/tools"): 16,
+    ("GET", "/api/reviews"): 16,
+    ("GET", "/api/stats"): 4,
+}
+
+# Limiter decision counters and in-flight requests per limited route
+metrics: Counter = Counter()
+in_flight: Counter = Counter()
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; return 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class MemoryLimiter:
+    """Per-worker token buckets keyed by client, evicting the least recently used"""
+
+    def __init__(self, max_keys: int = MAX_TRACKED_KEYS):
+        self.buckets: OrderedDict = OrderedDict()
+        self.max_keys = max_keys
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take()
+
+class MongoLimiter:
+    """Fixed-window counters shared across workers through MongoDB"""
+
+    collection_name = "rate_limits"
+
+    def __init__(self):
+        self.index_ready = False
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        from database import get_database
+        from pymongo import ReturnDocument
+        collection = get_database()[self.collection_name]
+        if not self.index_ready:
+            await collection.create_index([("expires_at", 1)], expireAfterSeconds=0)
+            self.index_ready = True
+
+        # A window long enough to hold one burst at the sustained rate
+        window = max(1, math.ceil(burst / rate))
+        now = time.time()
+        window_start = int(now // window) * window
+        doc = await collection.find_one_and_update(
+            {"_id": f"{key}:{window_start}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {
+                    "expires_at": datetime.utcnow() + timedelta(seconds=window * 2)
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc["count"] <= burst:
+            return 0.0
+        return window_start + window - now
+
+def get_limiter():
+    if RATE_LIMIT_BACKEND == "mongo":
+        return MongoLimiter()
+    return MemoryLimiter()
+
+limiter = get_limiter()
+# Concurrency slots per route, created on the event loop that uses them
+semaphores: dict = {}
+semaphores_loop = None
+
+def get_semaphore(route: tuple) -> Optional[asyncio.Semaphore]:
+    """The route's concurrency semaphore, or None if it has no limit"""
+    global semaphores, semaphores_loop
+    loop = asyncio.get_running_loop()
+    if loop is not semaphores_loop:
+        # Semaphores bind to one loop, so a new loop (app restart, another
+        # test client) gets a fresh set
+        semaphores = {}
+        semaphores_loop = loop
+    if route not in semaphores:
+        limit = CONCURRENCY_LIMITS.get(route)
+        if limit is None:
+            return None
+        semaphores[route] = asyncio.Semaphore(limit)
+    return semaphores[route]
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def too_many_requests(status_code: int, retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+async def rate_limit_middleware(request: Request, call_next):
+    """Apply token-bucket limits and per-route concurrency limits"""
+    if not RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+        return await call_next(request)
+
+    route = (request.method, request.url.path)
+    ip = client_ip(request)
+
+    # Token buckets per IP (stricter for bcrypt routes) and per user
+    if route in AUTH_ROUTES:
+        retry_after = await limiter.hit(f"auth:{ip}", AUTH_RATE, AUTH_BURST)
+    else:
+        retry_after = await limiter.hit(f"ip:{ip}", IP_RATE, IP_BURST)
+    if retry_after:
+        metrics["rejected_ip"] += 1
+        return too_many_requests(429, retry_after, "Too many requests")
+
+    user_id = token_subject(request.headers.get("authorization"))
+    if user_id:
+        retry_after = await limiter.hit(f"user:{user_id}", USER_RATE, USER_BURST)
+        if retry_after:
+            metrics["rejected_user"] += 1
+            return too_many_requests(429, retry_after, "Too many requests")
+
+    # Shed load once a request has queued too long for an expensive route
+    semaphore = get_semaphore(route)
+    if semaphore is None:
+        metrics["allowed"] += 1
+        return await call_next(request)
+
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics["shed_concurrency"] += 1
+        return too_many_requests(503, QUEUE_TIMEOUT, "Server busy, please retry")
+
+    metrics["allowed"] += 1
+    in_flight[route] += 1
+    try:
+        return await call_next(request)
+    finally:
+        in_flight[route] -= 1
+        semaphore.release()
+
+def limiter_stats() -> dict:
+    return {
+        "backend": RATE_LIMIT_BACKEND,
+        "decisions": dict(metrics),
+        "in_flight": {
+            f"{method} {path}": in_flight[(method, path)]
+            for method, path in CONCURRENCY_LIMITS
+        }
+    }
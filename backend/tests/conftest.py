@@ -0,0 +1,46 @@
+import asyncio
+import os
+import sys
+import pytest
+
+# Run the app on the in-memory backend with background work disabled
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("ARCHIVE_INTERVAL_SECONDS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database with the app's indexes"""
+    import database
+    from archive import create_archive_indexes
+
+    async def connect():
+        await database.connect_to_mongo()
+        await create_archive_indexes()
+
+    asyncio.run(connect())
+    return database.get_database()
+
+@pytest.fixture
+def admin_client():
+    """A TestClient on a fresh database and the headers of an admin user"""
+    from bson import ObjectId
+    from fastapi.testclient import TestClient
+    import database
+    import main
+
+    with TestClient(main.app) as client:
+        registered = client.post("/api/auth/register", json={
+            "email": "admin@example.com",
+            "name": "Admin",
+            "password": "secret1",
+            "confirmPassword": "secret1"
+        }).json()
+        client.portal.call(
+            database.get_database().users.update_one,
+            {"_id": ObjectId(registered["user"]["id"])},
+            {"$set": {"role": "admin"}}
+        )
+        yield client, {"Authorization": f"Bearer {registered['token']}"}
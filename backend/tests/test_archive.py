@@ -0,0 +1,162 @@
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+import pytest
+from archive import ARCHIVE_COLLECTION, archive_batch, archive_reviews
+from main import recalculate_tool_rating
+
+def days_ago(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+async def seed_tool(db) -> tuple:
+    """A tool with old and recent reviews in every status; returns its id and review ids"""
+    tool_id = str((await db.tools.insert_one({"name": "Whisper"})).inserted_id)
+    reviews = {
+        "old_approved": {"rating": 5, "status": "approved", "date": days_ago(400)},
+        "old_approved_2": {"rating": 2, "status": "approved", "date": days_ago(300)},
+        "old_pending": {"rating": 1, "status": "pending", "date": days_ago(365)},
+        "rejected": {"rating": 1, "status": "rejected", "date": days_ago(1)},
+        "recent_approved": {"rating": 4, "status": "approved", "date": days_ago(2)},
+    }
+    ids = {}
+    for name, review in reviews.items():
+        result = await db.reviews.insert_one({"tool_id": tool_id, "tool_name": "Whisper", **review})
+        ids[name] = result.inserted_id
+    await recalculate_tool_rating(tool_id)
+    return tool_id, ids
+
+async def rating(db, tool_id: str) -> tuple:
+    tool = await db.tools.find_one({"_id": ObjectId(tool_id)})
+    return tool["average_rating"], tool["review_count"]
+
+async def locations(db, ids: dict) -> dict:
+    """Where each review lives now: "hot", "archive" or None"""
+    found = {}
+    for name, review_id in ids.items():
+        if await db.reviews.find_one({"_id": review_id}):
+            found[name] = "hot"
+        elif await db[ARCHIVE_COLLECTION].find_one({"_id": review_id}):
+            found[name] = "archive"
+        else:
+            found[name] = None
+    return found
+
+def test_archival_moves_reviews_and_keeps_ratings(db):
+    async def scenario():
+        tool_id, ids = await seed_tool(db)
+        before = await rating(db, tool_id)
+        assert before == (3.7, 3)
+
+        assert await archive_reviews(recalculate_tool_rating) == 4
+        assert await locations(db, ids) == {
+            "old_approved": "archive",
+            "old_approved_2": "archive",
+            "old_pending": "archive",
+            "rejected": "archive",
+            "recent_approved": "hot",
+        }
+        assert await rating(db, tool_id) == before
+        assert await db[ARCHIVE_COLLECTION].count_documents({"totals_pending": True}) == 0
+
+        # A second run has nothing left to move and changes nothing
+        assert await archive_reviews(recalculate_tool_rating) == 0
+        assert await rating(db, tool_id) == before
+
+    asyncio.run(scenario())
+
+def test_review_moderated_mid_batch_stays_hot(db, monkeypatch):
+    async def scenario():
+        tool_id, ids = await seed_tool(db)
+        archive = db[ARCHIVE_COLLECTION]
+        insert_many = archive.insert_many
+
+        async def insert_then_moderate(documents, ordered=True):
+            result = await insert_many(documents, ordered=ordered)
+            # An admin rejects the review after it was copied, before the delete
+            await db.reviews.update_one({"_id": ids["old_approved"]}, {"$set": {"status": "rejected"}})
+            await recalculate_tool_rating(tool_id)
+            return result
+
+        monkeypatch.setattr(archive, "insert_many", insert_then_moderate)
+        await archive_batch(recalculate_tool_rating, 180, 500)
+        monkeypatch.undo()
+
+        assert (await locations(db, ids))["old_approved"] == "hot"
+        hot = await db.reviews.find_one({"_id": ids["old_approved"]})
+        assert hot["status"] == "rejected"
+        assert await archive.find_one({"_id": ids["old_approved"]}) is None
+        # The stale approved copy must not keep counting towards the rating
+        assert await rating(db, tool_id) == (3.0, 2)
+
+        # The next run archives it as rejected, and the rating holds
+        await archive_reviews(recalculate_tool_rating)
+        archived = await archive.find_one({"_id": ids["old_approved"]})
+        assert archived["status"] == "rejected"
+        assert await rating(db, tool_id) == (3.0, 2)
+
+    asyncio.run(scenario())
+
+def test_crash_before_totals_refresh_is_repaired(db, monkeypatch):
+    async def scenario():
+        tool_id, ids = await seed_tool(db)
+        before = await rating(db, tool_id)
+
+        async def crash(recalculate):
+            raise RuntimeError("worker died")
+
+        monkeypatch.setattr("archive.settle_pending_totals", crash)
+        with pytest.raises(RuntimeError):
+            await archive_batch(recalculate_tool_rating, 180, 500)
+        monkeypatch.undo()
+
+        # Hot reviews are gone but the tool never learned about the archived
+        # totals, so any recalculation now undercounts
+        assert (await locations(db, ids))["old_approved"] == "archive"
+        await recalculate_tool_rating(tool_id)
+        assert await rating(db, tool_id) == (4.0, 1)
+
+        assert await archive_reviews(recalculate_tool_rating) == 0
+        assert await rating(db, tool_id) == before
+        assert await db[ARCHIVE_COLLECTION].count_documents({"totals_pending": True}) == 0
+
+    asyncio.run(scenario())
+
+def test_archived_pending_review_can_be_moderated(admin_client):
+    client, headers = admin_client
+    tool = client.post("/api/tools", headers=headers, json={
+        "name": "Whisper",
+        "use_case": "Speech to text",
+        "category": "Audio",
+        "pricing_model": "Free"
+    }).json()
+    reviews = [
+        client.post("/api/reviews", headers=headers, json={"tool_id": tool["id"], "rating": rating}).json()
+        for rating in (5, 3)
+    ]
+    assert client.patch(f"/api/reviews/{reviews[0]['id']}", headers=headers, json={"status": "approved"}).status_code == 200
+
+    # Age both reviews past the archive cutoff
+    import database
+    client.portal.call(
+        database.get_database().reviews.update_many, {}, {"$set": {"date": days_ago(400)}}
+    )
+    assert client.post("/api/reviews/archive", headers=headers).json() == {"archived": 2}
+    tool_after = client.get(f"/api/tools/{tool['id']}", headers=headers).json()
+    assert (tool_after["average_rating"], tool_after["review_count"]) == (5.0, 1)
+
+    stats = client.get("/api/stats", headers=headers).json()
+    assert (stats["total_reviews"], stats["archived_reviews"]) == (2, 2)
+    assert (stats["approved_reviews"], stats["pending_reviews"]) == (1, 1)
+
+    moderated = client.patch(f"/api/reviews/{reviews[1]['id']}", headers=headers, json={"status": "approved"})
+    assert moderated.status_code == 200
+    assert moderated.json()["status"] == "approved"
+    tool_after = client.get(f"/api/tools/{tool['id']}", headers=headers).json()
+    assert (tool_after["average_rating"], tool_after["review_count"]) == (4.0, 2)
+
+    archived = client.get("/api/reviews/archive", headers=headers).json()
+    assert [r["id"] for r in archived] == [reviews[0]["id"]]
+    stats = client.get("/api/stats", headers=headers).json()
+    assert (stats["total_reviews"], stats["archived_reviews"], stats["approved_reviews"]) == (2, 1, 2)
+
+    assert client.patch(f"/api/reviews/{ObjectId()}", headers=headers, json={"status": "approved"}).status_code == 404
@@ -0,0 +1,95 @@
+from collections import Counter
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+import compression
+from compression import CompressedCache, CompressionMiddleware, choose_encoding, supported_encodings
+
+BIG_BODY = b'{"tools": [' + b",".join(b'{"name": "tool %d"}' % i for i in range(500)) + b"]}"
+
+def test_choose_encoding_respects_refusals():
+    preferred = supported_encodings()[0]
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("*") == preferred
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*;q=0") is None
+    # A refused encoding stays refused even when a wildcard is accepted
+    assert choose_encoding("gzip;q=0, br;q=0, *") is None
+    assert choose_encoding("br;q=0, *") == "gzip"
+
+@pytest.fixture
+def client(monkeypatch):
+    """A small app behind the compression middleware with a fresh cache"""
+    monkeypatch.setattr(compression, "cache", CompressedCache(1024 * 1024))
+    monkeypatch.setattr(compression, "metrics", Counter())
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/big")
+    async def big():
+        return Response(BIG_BODY, media_type="application/json", headers={"Vary": "Origin"})
+
+    @app.get("/small")
+    async def small():
+        return Response(b'{"ok": true}', media_type="application/json")
+
+    @app.get("/events")
+    async def events():
+        async def body():
+            yield "data: " + "x" * 4096 + "\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.mark.parametrize("encoding", supported_encodings())
+def test_large_responses_are_compressed(client, encoding):
+    response = client.get("/big", headers={"Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(compression.compress(BIG_BODY, encoding))
+    assert int(response.headers["content-length"]) < len(BIG_BODY)
+    # The client decodes the body back to the original
+    assert response.content == BIG_BODY
+
+def test_identical_responses_hit_the_cache(client):
+    first = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert first.content == second.content == BIG_BODY
+    assert (compression.metrics["cache_misses"], compression.metrics["cache_hits"]) == (1, 1)
+    assert compression.metrics["responses"] == 2
+    # A different query string is a different cache entry
+    client.get("/big?page=2", headers={"Accept-Encoding": "gzip"})
+    assert compression.metrics["cache_misses"] == 2
+
+def test_small_responses_pass_through(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(b'{"ok": true}'))
+    assert compression.metrics["responses"] == 0
+
+def test_event_streams_pass_through(client):
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text.startswith("data: xxx")
+    assert compression.metrics["responses"] == 0
+
+def test_clients_without_accept_encoding_get_identity(client):
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == BIG_BODY
+
+def test_app_responses_are_compressed_through_the_middleware_stack(admin_client):
+    client, headers = admin_client
+    for i in range(20):
+        client.post("/api/tools", headers=headers, json={
+            "name": f"Tool {i}",
+            "use_case": "Speech to text " * 3,
+            "category": "Audio",
+            "pricing_model": "Free"
+        })
+    response = client.get("/api/tools", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 20
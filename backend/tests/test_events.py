@@ -0,0 +1,49 @@
+import asyncio
+import database
+import events
+from events import EventHub
+
+def test_publish_dispatches_locally():
+    async def scenario():
+        hub = EventHub()
+        user = hub.subscribe(is_admin=False)
+        admin = hub.subscribe(is_admin=True)
+        await hub.publish("tool_rating", {"tool_id": "t1"})
+        await hub.publish("review_pending", {"review_id": "r1"}, audience=events.AUDIENCE_ADMIN)
+        assert user.queue.qsize() == 1
+        assert admin.queue.qsize() == 2
+
+    asyncio.run(scenario())
+
+def test_change_stream_mode_on_memory_backend_dispatches_locally(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_CHANGE_STREAM", True)
+
+    async def scenario():
+        await database.connect_to_mongo()
+        hub = EventHub()
+        await hub.start()
+        assert hub.watch_task is None
+        subscription = hub.subscribe(is_admin=False)
+        await hub.publish("tool_rating", {"tool_id": "t1"})
+        assert (await subscription.queue.get())["data"] == {"tool_id": "t1"}
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+def test_events_are_dispatched_locally_until_the_stream_opens(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_CHANGE_STREAM", True)
+
+    async def scenario():
+        await database.connect_to_mongo()
+        hub = EventHub()
+        # A standalone mongod cannot open a change stream
+        hub.watch_task = asyncio.create_task(hub._watch())
+        await asyncio.sleep(0)
+        subscription = hub.subscribe(is_admin=False)
+        await hub.publish("tool_rating", {"tool_id": "t1"})
+        assert not hub.stream_open
+        assert subscription.queue.qsize() == 1
+        assert await database.get_database()[events.EVENTS_COLLECTION].count_documents({}) == 0
+        await hub.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime
+from archive import ARCHIVE_COLLECTION
+from history import HISTORY_COLLECTION, backfill_rating_history, get_rating_history, record_moderation
+
+def today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+async def buckets(db) -> list:
+    return await db[HISTORY_COLLECTION].find({}, {"_id": 0}).sort("day", 1).to_list(length=None)
+
+def test_moderation_applies_bucket_deltas(db):
+    async def scenario():
+        review = {"tool_id": "t1", "rating": 4, "status": "pending"}
+        await record_moderation(review, "approved")
+        await record_moderation({**review, "status": "approved"}, "rejected")
+        await record_moderation({**review, "status": "rejected"}, "approved")
+        # Re-approving an approved review (a concurrent duplicate) changes nothing
+        await record_moderation({**review, "status": "approved"}, "approved")
+        # Rejecting a pending review never touched the bucket
+        await record_moderation({**review, "rating": 2}, "rejected")
+
+        assert await buckets(db) == [
+            {"tool_id": "t1", "day": today(), "count": 1, "sum": 4, "stars": {"4": 1}}
+        ]
+
+    asyncio.run(scenario())
+
+def test_running_average_is_seeded_from_earlier_buckets(db):
+    async def scenario():
+        await db[HISTORY_COLLECTION].insert_many([
+            {"tool_id": "t1", "day": "2026-08-30", "count": 2, "sum": 10, "stars": {"5": 2}},
+            {"tool_id": "t1", "day": "2026-09-02", "count": 1, "sum": 1, "stars": {"1": 1}},
+            {"tool_id": "t1", "day": "2026-09-10", "count": 1, "sum": 3, "stars": {"3": 1}},
+            {"tool_id": "t2", "day": "2026-09-01", "count": 5, "sum": 5, "stars": {"1": 5}},
+        ])
+
+        full = await get_rating_history("t1")
+        assert [(b["day"], b["total_count"], b["average_rating"]) for b in full] == [
+            ("2026-08-30", 2, 5.0),
+            ("2026-09-02", 3, 3.7),
+            ("2026-09-10", 4, 3.5),
+        ]
+
+        # A range starting mid-history carries the totals from before it
+        ranged = await get_rating_history("t1", "2026-09-01", "2026-09-05")
+        assert [(b["day"], b["total_count"], b["average_rating"]) for b in ranged] == [
+            ("2026-09-02", 3, 3.7),
+        ]
+        assert ranged[0]["stars"] == {"1": 1, "2": 0, "3": 0, "4": 0, "5": 0}
+        assert await get_rating_history("t1", "2026-09-11") == []
+
+    asyncio.run(scenario())
+
+def test_history_endpoint_counts_once_and_normalises_dates(admin_client):
+    client, headers = admin_client
+    tool = client.post("/api/tools", headers=headers, json={
+        "name": "Whisper",
+        "use_case": "Speech to text",
+        "category": "Audio",
+        "pricing_model": "Free"
+    }).json()
+    review = client.post("/api/reviews", headers=headers, json={"tool_id": tool["id"], "rating": 5}).json()
+    for _ in range(2):
+        client.patch(f"/api/reviews/{review['id']}", headers=headers, json={"status": "approved"})
+
+    url = f"/api/tools/{tool['id']}/history"
+    # Each moderation sees the status it replaced, so a repeat approval is a no-op
+    assert [(b["count"], b["sum"]) for b in client.get(url, headers=headers).json()] == [(1, 5)]
+    year, month, day = (int(part) for part in today().split("-"))
+    unpadded = f"{year}-{month}-{day}"
+    assert [b["day"] for b in client.get(url, headers=headers, params={"from": unpadded}).json()] == [today()]
+    assert [b["day"] for b in client.get(url, headers=headers, params={"to": unpadded}).json()] == [today()]
+    assert client.get(url, headers=headers, params={"from": "yesterday"}).status_code == 400
+
+def test_backfill_rebuilds_buckets_from_hot_and_archived_reviews(db):
+    async def scenario():
+        await db.reviews.insert_many([
+            {"tool_id": "t1", "rating": 5, "status": "approved", "date": "2026-09-01"},
+            {"tool_id": "t1", "rating": 3, "status": "approved", "date": "2026-09-01"},
+            {"tool_id": "t1", "rating": 2, "status": "pending", "date": "2026-09-01"},
+            {"tool_id": "t2", "rating": 4, "status": "approved", "date": "2026-09-03"},
+        ])
+        await db[ARCHIVE_COLLECTION].insert_many([
+            {"tool_id": "t1", "rating": 5, "status": "approved", "date": "2026-09-01"},
+            {"tool_id": "t1", "rating": 1, "status": "rejected", "date": "2026-08-01"},
+            {"tool_id": "t1", "rating": 1, "status": "approved", "date": "2026-08-01"},
+        ])
+        # Stale buckets are replaced
+        await db[HISTORY_COLLECTION].insert_one({"tool_id": "t1", "day": "2026-07-01", "count": 9, "sum": 9})
+
+        assert await backfill_rating_history() == 3
+        assert await buckets(db) == [
+            {"tool_id": "t1", "day": "2026-08-01", "count": 1, "sum": 1, "stars": {"1": 1}},
+            {"tool_id": "t1", "day": "2026-09-01", "count": 3, "sum": 13, "stars": {"5": 2, "3": 1}},
+            {"tool_id": "t2", "day": "2026-09-03", "count": 1, "sum": 4, "stars": {"4": 1}},
+        ]
+        history_t1 = await get_rating_history("t1")
+        assert history_t1[-1]["total_count"] == 4 and history_t1[-1]["average_rating"] == 3.5
+
+    asyncio.run(scenario())
@@ -0,0 +1,223 @@
+import asyncio
+import random
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from memory_db import MemoryCollection
+
+VALUES = [None, 0, 1, 2, 2.5, 3, "a", "b", "c", True, False, datetime(2026, 1, 1)]
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def strip_ids(docs: list) -> list:
+    return sorted(repr(sorted((k, repr(v)) for k, v in d.items() if k != "_id")) for d in docs)
+
+def random_filter(rng: random.Random) -> dict:
+    value = lambda: rng.choice(VALUES)
+    op = lambda: rng.choice(["$gt", "$gte", "$lt", "$lte"])
+    return rng.choice([
+        {"x": value()},
+        {"x": {op(): value()}},
+        {"x": {"$gt": 0, "$lte": 3}},
+        {"x": {op(): value()}, "y": value()},
+        {"x": {"$in": [value(), value()]}},
+        {"x": {"$eq": value()}},
+        {"$or": [{"x": value()}, {"y": {op(): value()}}]},
+        {"$or": [{"x": value()}, {"z": value()}]},
+        {"y": value(), "x": value()},
+    ])
+
+def test_indexed_queries_match_full_scans():
+    """Index-backed find/count_documents return the same documents as a scan"""
+    async def scenario():
+        rng = random.Random(7)
+        indexed = MemoryCollection("indexed")
+        scanned = MemoryCollection("scanned")
+        await indexed.create_index([("x", 1)])
+        await indexed.create_index([("y", 1), ("x", -1)])
+
+        for _ in range(400):
+            doc = {"x": rng.choice(VALUES), "y": rng.choice(VALUES), "z": rng.randint(0, 3)}
+            if rng.random() < 0.1:
+                del doc["x"]
+            await indexed.insert_one(dict(doc))
+            await scanned.insert_one(dict(doc))
+
+        for _ in range(300):
+            query_filter = random_filter(rng)
+            found = await indexed.find(query_filter).to_list(length=None)
+            expected = await scanned.find(query_filter).to_list(length=None)
+            assert strip_ids(found) == strip_ids(expected), query_filter
+            assert await indexed.count_documents(query_filter) == len(expected)
+
+            # Exercise index maintenance on updates and deletes
+            roll = rng.random()
+            if roll < 0.3:
+                update = {"$set": {"x": rng.choice(VALUES)}, "$inc": {"z": 1}}
+                await indexed.update_one(query_filter, update)
+                await scanned.update_one(query_filter, update)
+            elif roll < 0.4:
+                await indexed.delete_many(query_filter)
+                await scanned.delete_many(query_filter)
+
+        assert await indexed.count_documents({}) == await scanned.count_documents({})
+
+    run(scenario())
+
+def test_index_hits_keep_natural_order():
+    async def scenario():
+        collection = MemoryCollection("ordered")
+        await collection.create_index([("group", 1)])
+        ids = [(await collection.insert_one({"group": i % 2, "n": i})).inserted_id for i in range(10)]
+        found = await collection.find({"group": 0}).to_list(length=None)
+        assert [d["_id"] for d in found] == ids[0::2]
+
+    run(scenario())
+
+def test_update_one_upsert_seeds_filter_and_incs():
+    async def scenario():
+        collection = MemoryCollection("buckets")
+        await collection.create_index([("tool_id", 1), ("day", 1)], unique=True)
+        query_filter = {"tool_id": "t1", "day": "2026-10-01"}
+        update = {"$inc": {"count": 1, "sum": 4, "stars.4": 1}}
+
+        result = await collection.update_one(query_filter, update, upsert=True)
+        assert result.matched_count == 0 and result.upserted_id is not None
+        result = await collection.update_one(query_filter, {"$inc": {"count": -1, "sum": -4, "stars.4": -1}}, upsert=True)
+        assert result.matched_count == 1 and result.modified_count == 1
+        await collection.update_one(query_filter, update, upsert=True)
+
+        bucket = await collection.find_one(query_filter, {"_id": 0})
+        assert bucket == {"tool_id": "t1", "day": "2026-10-01", "count": 1, "sum": 4, "stars": {"4": 1}}
+        assert await collection.count_documents({}) == 1
+
+        missing = await collection.update_one({"tool_id": "t2"}, update)
+        assert missing.matched_count == 0 and missing.upserted_id is None
+
+    run(scenario())
+
+def test_find_one_and_update_returns_requested_version():
+    async def scenario():
+        collection = MemoryCollection("reviews")
+        review_id = (await collection.insert_one({"status": "pending"})).inserted_id
+        before = await collection.find_one_and_update(
+            {"_id": review_id}, {"$set": {"status": "approved"}}
+        )
+        assert before["status"] == "pending"
+        after = await collection.find_one_and_update(
+            {"_id": review_id}, {"$set": {"status": "rejected"}},
+            return_document=ReturnDocument.AFTER
+        )
+        assert after["status"] == "rejected"
+
+    run(scenario())
+
+def test_unique_indexes_reject_duplicates():
+    async def scenario():
+        collection = MemoryCollection("users")
+        await collection.create_index([("email", 1)], unique=True)
+        await collection.insert_one({"email": "a@example.com"})
+        other = await collection.insert_one({"email": "b@example.com"})
+
+        with pytest.raises(DuplicateKeyError):
+            await collection.insert_one({"email": "a@example.com"})
+        with pytest.raises(DuplicateKeyError):
+            await collection.update_one({"_id": other.inserted_id}, {"$set": {"email": "a@example.com"}})
+        # A failed update leaves the document and its index entries intact
+        assert await collection.find_one({"email": "b@example.com"}) is not None
+
+        with pytest.raises(BulkWriteError) as error:
+            await collection.insert_many(
+                [{"email": "c@example.com"}, {"email": "a@example.com"}, {"email": "d@example.com"}],
+                ordered=False
+            )
+        assert [e["index"] for e in error.value.details["writeErrors"]] == [1]
+        assert await collection.count_documents({}) == 4
+
+    run(scenario())
+
+def test_documents_are_copied_in_and_out():
+    async def scenario():
+        collection = MemoryCollection("tools")
+        doc = {"name": "X", "tags": ["a"]}
+        await collection.insert_one(doc)
+        assert isinstance(doc["_id"], ObjectId)
+        doc["tags"].append("b")
+        stored = await collection.find_one({"_id": doc["_id"]})
+        stored["name"] = "Y"
+        assert await collection.find_one({"_id": doc["_id"]}) == {"_id": doc["_id"], "name": "X", "tags": ["a"]}
+
+    run(scenario())
+
+def test_cursor_sort_skip_limit_and_aggregate():
+    async def scenario():
+        collection = MemoryCollection("reviews")
+        await collection.create_index([("tool_id", 1), ("status", 1)])
+        for i in range(10):
+            await collection.insert_one({
+                "tool_id": f"t{i % 2}",
+                "status": "approved" if i % 3 else "pending",
+                "rating": i % 5 + 1,
+                "date": f"2026-01-{i + 1:02d}"
+            })
+
+        page = await collection.find({}).sort("date", -1).skip(2).limit(3).to_list(length=None)
+        assert [d["date"] for d in page] == ["2026-01-08", "2026-01-07", "2026-01-06"]
+
+        rows = await collection.aggregate([
+            {"$match": {"tool_id": {"$in": ["t0", "t1"]}, "status": "approved"}},
+            {"$group": {"_id": "$tool_id", "sum": {"$sum": "$rating"}, "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}}
+        ]).to_list(length=None)
+        expected = {}
+        async for d in collection.find({"status": "approved"}):
+            total, count = expected.get(d["tool_id"], (0, 0))
+            expected[d["tool_id"]] = (total + d["rating"], count + 1)
+        assert rows == [{"_id": k, "sum": v[0], "count": v[1]} for k, v in sorted(expected.items())]
+
+    run(scenario())
+
+def test_api_end_to_end_on_memory_backend():
+    from fastapi.testclient import TestClient
+    import database
+    import main
+
+    with TestClient(main.app) as client:
+        registered = client.post("/api/auth/register", json={
+            "email": "admin@example.com",
+            "name": "Admin",
+            "password": "secret1",
+            "confirmPassword": "secret1"
+        })
+        assert registered.status_code == 200
+        headers = {"Authorization": f"Bearer {registered.json()['token']}"}
+        client.portal.call(
+            database.get_database().users.update_one,
+            {"_id": ObjectId(registered.json()["user"]["id"])},
+            {"$set": {"role": "admin"}}
+        )
+
+        tool = client.post("/api/tools", headers=headers, json={
+            "name": "Whisper",
+            "use_case": "Speech to text",
+            "category": "Audio",
+            "pricing_model": "Free"
+        }).json()
+        review = client.post("/api/reviews", headers=headers, json={"tool_id": tool["id"], "rating": 4}).json()
+        assert review["status"] == "pending"
+
+        moderated = client.patch(f"/api/reviews/{review['id']}", headers=headers, json={"status": "approved"})
+        assert moderated.json()["status"] == "approved"
+
+        tools = client.get("/api/tools", headers=headers, params={"category": "Audio", "min_rating": 3}).json()
+        assert [(t["id"], t["average_rating"], t["review_count"]) for t in tools] == [(tool["id"], 4.0, 1)]
+        assert client.get("/api/tools", headers=headers, params={"min_rating": 4.5}).json() == []
+
+        stats = client.get("/api/stats", headers=headers).json()
+        assert stats["total_tools"] == 1 and stats["approved_reviews"] == 1
+
+        assert client.delete(f"/api/tools/{tool['id']}", headers=headers).status_code == 200
+        assert client.get("/api/stats", headers=headers).json()["total_reviews"] == 0
@@ -0,0 +1,63 @@
+import sys
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+import profiler
+from profiler import ProfilerMiddleware
+
+@pytest.fixture
+def profiled(monkeypatch):
+    """A small app that profiles every request"""
+    monkeypatch.setattr(profiler, "PROFILE_SAMPLE_RATE", 1.0)
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware)
+    seen = {}
+
+    def stream(name: str):
+        async def body():
+            yield "retry: 3000\n\n"
+            # The response has started, so sampling must already be off
+            seen[name] = (len(profiler.profiler.active), sys.getswitchinterval())
+            yield "data: {}\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    @app.get("/api/events")
+    async def events():
+        return stream("events")
+
+    @app.get("/other-stream")
+    async def other_stream():
+        return stream("other")
+
+    @app.get("/work")
+    async def work():
+        return {"total": sum(range(200000))}
+
+    return app, seen
+
+def test_regular_requests_are_profiled(profiled):
+    app, _ = profiled
+    with TestClient(app) as client:
+        response = client.get("/work")
+    profile = profiler.profiler.get(int(response.headers["x-profile-id"]))
+    assert profile.path == "/work" and profile.status_code == 200
+    assert not profiler.profiler.active
+
+def test_event_stream_route_is_never_profiled(profiled):
+    app, seen = profiled
+    switch_interval = sys.getswitchinterval()
+    with TestClient(app) as client:
+        response = client.get("/api/events")
+    assert "x-profile-id" not in response.headers
+    assert seen["events"] == (0, switch_interval)
+
+def test_profiling_stops_when_a_stream_starts(profiled):
+    app, seen = profiled
+    switch_interval = sys.getswitchinterval()
+    with TestClient(app) as client:
+        response = client.get("/other-stream")
+    assert "x-profile-id" in response.headers
+    assert seen["other"] == (0, switch_interval)
+    assert not profiler.profiler.active
+    assert sys.getswitchinterval() == switch_interval
@@ -0,0 +1,238 @@
+"""Plan analysis against explain documents in the layouts mongod returns
+
+The explain fixtures follow the classic (explainVersion "1") and slot-based
+(explainVersion "2", MongoDB 6.0+) formats, trimmed to the fields the checker
+reads. Replace them with output saved by `--dump-explains` when a plan changes.
+"""
+import argparse
+import asyncio
+import query_plan_check
+from query_plan_check import (
+    analyze,
+    count_pipeline,
+    execution_stats,
+    group_input_count,
+    load_baseline,
+    plan_indexes,
+    plan_stages,
+    query_shapes,
+    recommend_indexes,
+    seed,
+    write_baseline
+)
+
+def find_explain(winning_plan: dict, returned: int, docs: int, keys: int, stages: dict) -> dict:
+    return {
+        "explainVersion": "1",
+        "queryPlanner": {"namespace": "db.tools", "winningPlan": winning_plan, "rejectedPlans": []},
+        "executionStats": {
+            "executionSuccess": True,
+            "nReturned": returned,
+            "executionTimeMillis": 3,
+            "totalKeysExamined": keys,
+            "totalDocsExamined": docs,
+            "executionStages": stages
+        },
+        "command": {},
+        "ok": 1.0
+    }
+
+INDEXED_FIND = find_explain(
+    {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "category_1_pricing_model_1_average_rating_1"}},
+    returned=22, docs=22, keys=23,
+    stages={"stage": "FETCH", "nReturned": 22, "docsExamined": 22,
+            "inputStage": {"stage": "IXSCAN", "nReturned": 22, "keysExamined": 23}}
+)
+
+# A single-field index picked for a three-field filter: most fetched docs are discarded
+FILTERED_FIND = find_explain(
+    {"stage": "FETCH", "filter": {"$and": []}, "inputStage": {"stage": "IXSCAN", "indexName": "category_1"}},
+    returned=22, docs=333, keys=333,
+    stages={"stage": "FETCH", "nReturned": 22, "docsExamined": 333,
+            "inputStage": {"stage": "IXSCAN", "nReturned": 333, "keysExamined": 333}}
+)
+
+COLLSCAN_FIND = find_explain(
+    {"stage": "COLLSCAN", "filter": {"email": {"$eq": "a@example.com"}}, "direction": "forward"},
+    returned=1, docs=500, keys=0,
+    stages={"stage": "COLLSCAN", "nReturned": 1, "docsExamined": 500}
+)
+
+SORTED_FIND = find_explain(
+    {"stage": "SORT", "sortPattern": {"date": -1}, "limitAmount": 100,
+     "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "tool_id_1_status_1"}}},
+    returned=6, docs=6, keys=6,
+    stages={"stage": "SORT", "nReturned": 6,
+            "inputStage": {"stage": "FETCH", "nReturned": 6, "inputStage": {"stage": "IXSCAN", "nReturned": 6}}}
+)
+
+# Slot-based engine with the $group pushed into the query: executionStats count
+# groups, and the SBE stage tree is what holds the per-stage input counts
+PUSHED_DOWN_GROUP = {
+    "explainVersion": "2",
+    "queryPlanner": {
+        "winningPlan": {
+            "queryPlan": {
+                "stage": "GROUP", "planNodeId": 3,
+                "inputStage": {"stage": "FETCH", "planNodeId": 2,
+                               "inputStage": {"stage": "IXSCAN", "planNodeId": 1, "indexName": "tool_id_1_status_1_date_-1"}}
+            },
+            "slotBasedPlan": {"slots": "$$RESULT=s12", "stages": "[3] project [s12 = ...]"}
+        },
+        "rejectedPlans": []
+    },
+    "executionStats": {
+        "executionSuccess": True,
+        "nReturned": 10,
+        "executionTimeMillis": 2,
+        "totalKeysExamined": 96,
+        "totalDocsExamined": 96,
+        "executionStages": {
+            "stage": "project", "planNodeId": 3, "nReturned": 10,
+            "inputStage": {
+                "stage": "group", "planNodeId": 3, "nReturned": 10,
+                "inputStage": {
+                    "stage": "nlj", "planNodeId": 2, "nReturned": 96,
+                    "outerStage": {"stage": "ixseek", "planNodeId": 1, "nReturned": 96},
+                    "innerStage": {"stage": "seek", "planNodeId": 2, "nReturned": 96}
+                }
+            }
+        }
+    },
+    "ok": 1.0
+}
+
+# Classic engine: the $group runs in the pipeline after a $cursor stage, whose
+# own stats already count the matched documents
+CLASSIC_GROUP = {
+    "explainVersion": "1",
+    "stages": [
+        {"$cursor": {
+            "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_1"}}},
+            "executionStats": {
+                "nReturned": 4000, "executionTimeMillis": 9,
+                "totalKeysExamined": 4000, "totalDocsExamined": 4000,
+                "executionStages": {"stage": "FETCH", "nReturned": 4000,
+                                    "inputStage": {"stage": "IXSCAN", "nReturned": 4000}}
+            }
+        }, "nReturned": 4000},
+        {"$group": {"_id": {"$const": 1}, "n": {"$sum": {"$const": 1}}}, "nReturned": 1}
+    ],
+    "ok": 1.0
+}
+
+GROUPED_SHAPE = {
+    "name": "refresh_archived_totals",
+    "collection": "reviews_archive",
+    "pipeline": [
+        {"$match": {"tool_id": {"$in": ["a", "b"]}, "status": "approved"}},
+        {"$group": {"_id": "$tool_id", "sum": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+    ]
+}
+
+def test_execution_stats_and_plan_details():
+    assert execution_stats(FILTERED_FIND) == {
+        "docs_examined": 333, "keys_examined": 333, "returned": 22, "millis": 3
+    }
+    assert plan_stages(INDEXED_FIND) == ["FETCH", "IXSCAN"]
+    assert plan_indexes(INDEXED_FIND) == ["category_1_pricing_model_1_average_rating_1"]
+    # The classic $cursor stage's stats are the query's own
+    assert execution_stats(CLASSIC_GROUP)["returned"] == 4000
+    assert plan_indexes(PUSHED_DOWN_GROUP) == ["tool_id_1_status_1_date_-1"]
+
+def test_group_input_count():
+    assert group_input_count(PUSHED_DOWN_GROUP, 10) == 96
+    # Without a group in the query plan, the query's own count is the input
+    assert group_input_count(CLASSIC_GROUP, 4000) == 4000
+    assert group_input_count(INDEXED_FIND, 22) == 22
+    # A group whose input stage is missing can't be measured
+    unreadable = {"executionStats": {"executionStages": {"stage": "group", "nReturned": 1}}}
+    assert group_input_count(unreadable, 1) is None
+
+def test_analyze_accepts_index_backed_shapes():
+    shape = {"name": "get_tools", "collection": "tools",
+             "filter": {"category": "NLP", "pricing_model": "Paid", "average_rating": {"$gte": 4.0}}}
+    result = analyze(shape, INDEXED_FIND, 4.0)
+    assert result["problems"] == [] and result["recommendations"] == []
+    assert result["ratio"] == 1.0
+
+def test_analyze_measures_grouped_shapes_by_their_input():
+    # 96 docs for 10 groups would be a 9.6 ratio against the group count
+    result = analyze(GROUPED_SHAPE, PUSHED_DOWN_GROUP, 4.0)
+    assert result["ratio"] == 1.0 and result["problems"] == []
+
+    count_shape = {"name": "get_stats approved_reviews", "collection": "reviews",
+                   "pipeline": count_pipeline({"status": "approved"})}
+    result = analyze(count_shape, CLASSIC_GROUP, 4.0)
+    assert result["ratio"] == 1.0 and result["problems"] == []
+
+    unreadable = {"executionStats": {"totalDocsExamined": 50, "nReturned": 1,
+                                     "executionStages": {"stage": "group", "nReturned": 1}}}
+    result = analyze(GROUPED_SHAPE, unreadable, 4.0)
+    assert result["ratio"] is None and result["problems"] == []
+
+def test_analyze_flags_and_recommends():
+    shape = {"name": "get_tools", "collection": "tools",
+             "filter": {"category": "NLP", "pricing_model": "Paid", "average_rating": {"$gte": 4.0}}}
+    result = analyze(shape, FILTERED_FIND, 4.0)
+    assert result["problems"] == ["docsExamined/nReturned 15.1 > 4.0"]
+    assert result["recommendations"] == [
+        'database.tools.create_index([("category", ASCENDING), ("pricing_model", ASCENDING), '
+        '("average_rating", ASCENDING)])'
+    ]
+
+    login = {"name": "login", "collection": "users", "filter": {"email": "a@example.com"}}
+    assert analyze(login, COLLSCAN_FIND, 4.0)["problems"] == ["COLLSCAN", "docsExamined/nReturned 500.0 > 4.0"]
+    # Whole-collection reads by design are not flagged
+    assert analyze({**login, "full_scan": True}, COLLSCAN_FIND, 4.0)["problems"] == []
+
+    archived = {"name": "get_archived_reviews", "collection": "reviews_archive",
+                "filter": {"tool_id": "t1", "status": "approved"}, "sort": {"date": -1}, "limit": 100}
+    result = analyze(archived, SORTED_FIND, 4.0)
+    assert result["problems"] == ["in-memory SORT"]
+    assert result["recommendations"] == [
+        'database.reviews_archive.create_index([("tool_id", ASCENDING), ("status", ASCENDING), '
+        '("date", DESCENDING)])'
+    ]
+
+def test_recommend_indexes_follows_equality_sort_range():
+    assert recommend_indexes({"tool_id": "t1", "day": {"$gte": "a", "$lte": "b"}}, {"day": 1}) == [
+        [("tool_id", 1), ("day", 1)]
+    ]
+    assert recommend_indexes({"average_rating": {"$gte": 4}, "category": "NLP"}, {"name": 1}) == [
+        [("category", 1), ("name", 1), ("average_rating", 1)]
+    ]
+    assert recommend_indexes({"$or": [{"status": "rejected"}, {"date": {"$lt": "x"}}]}) == [
+        [("status", 1)], [("date", 1)]
+    ]
+    # _id lookups need nothing extra
+    assert recommend_indexes({"_id": 1}) == []
+
+def test_query_shapes_are_valid_queries(db):
+    """Every shape runs against seeded data on the in-memory backend"""
+    async def scenario():
+        sample = await seed(db, tool_count=50, review_count=600, user_count=10)
+        shapes = query_shapes(sample)
+        assert len({shape["name"] for shape in shapes}) == len(shapes)
+        for shape in shapes:
+            collection = db[shape["collection"]]
+            if "pipeline" in shape:
+                await collection.aggregate(shape["pipeline"]).to_list(length=None)
+            else:
+                cursor = collection.find(shape["filter"])
+                if shape.get("sort"):
+                    cursor = cursor.sort(list(shape["sort"].items()))
+                await cursor.limit(shape.get("limit", 0)).to_list(length=None)
+        assert await db.reviews_archive.count_documents({"totals_pending": True}) == 10
+
+    asyncio.run(scenario())
+
+def test_baseline_round_trip(tmp_path):
+    path = str(tmp_path / "baseline.txt")
+    assert load_baseline(path) == set()
+    write_baseline(path, [{"name": "get_tools (category)"}, {"name": "login / register"}])
+    assert load_baseline(path) == {"get_tools (category)", "login / register"}
+
+def test_run_refuses_the_application_database():
+    args = argparse.Namespace(database=query_plan_check.APP_DATABASE)
+    assert asyncio.run(query_plan_check.run(args)) == 2
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import ratelimit
+from auth import create_access_token
+from ratelimit import TokenBucket, MemoryLimiter, rate_limit_middleware
+
+@pytest.fixture
+def limited(monkeypatch):
+    """A small app behind the limiter with tiny bursts and timeouts"""
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "IP_RATE", 0.01)
+    monkeypatch.setattr(ratelimit, "IP_BURST", 100)
+    monkeypatch.setattr(ratelimit, "USER_RATE", 0.01)
+    monkeypatch.setattr(ratelimit, "USER_BURST", 2)
+    monkeypatch.setattr(ratelimit, "QUEUE_TIMEOUT", 0.05)
+    monkeypatch.setattr(ratelimit, "CONCURRENCY_LIMITS", {("GET", "/slow"): 1})
+    monkeypatch.setattr(ratelimit, "limiter", MemoryLimiter())
+    monkeypatch.setattr(ratelimit, "metrics", ratelimit.metrics.__class__())
+
+    app = FastAPI()
+    app.middleware("http")(rate_limit_middleware)
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.3)
+        return {"ok": True}
+
+    return app
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+
+    now[0] += 0.25
+    assert bucket.take() == pytest.approx(0.25)
+    now[0] += 0.25
+    assert bucket.take() == 0
+    # Refill never exceeds the burst capacity
+    now[0] += 60
+    assert [bucket.take() for _ in range(3)][:2] == [0, 0]
+    assert bucket.take() > 0
+
+def test_ip_bucket_returns_429_with_retry_after(limited, monkeypatch):
+    monkeypatch.setattr(ratelimit, "IP_BURST", 3)
+    with TestClient(limited) as client:
+        statuses = [client.get("/fast").status_code for _ in range(3)]
+        rejected = client.get("/fast")
+    assert statuses == [200, 200, 200]
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert ratelimit.metrics["allowed"] == 3
+    assert ratelimit.metrics["rejected_ip"] == 1
+
+def test_user_bucket_applies_per_token(limited):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user-1'})}"}
+    with TestClient(limited) as client:
+        statuses = [client.get("/fast", headers=headers).status_code for _ in range(3)]
+        # Anonymous requests from the same IP are not charged to the user
+        anonymous = client.get("/fast")
+    assert statuses == [200, 200, 429]
+    assert anonymous.status_code == 200
+    assert ratelimit.metrics["rejected_user"] == 1
+
+def contend(client: TestClient) -> tuple:
+    """Send a second /slow request while the first holds the only slot"""
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(response=client.get("/slow")))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not ratelimit.in_flight[("GET", "/slow")]:
+        assert time.monotonic() < deadline, "first request never took the slot"
+    second = client.get("/slow")
+    thread.join()
+    return first["response"], second
+
+def test_queued_requests_are_shed_with_503(limited):
+    with TestClient(limited) as client:
+        first, shed = contend(client)
+    assert first.status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert ratelimit.metrics["shed_concurrency"] == 1
+    assert ratelimit.in_flight[("GET", "/slow")] == 0
+
+def test_semaphores_follow_the_event_loop(limited):
+    # Each client runs its own loop, so contention must work in both
+    for _ in range(2):
+        with TestClient(limited) as client:
+            first, shed = contend(client)
+            assert (first.status_code, shed.status_code) == (200, 503)